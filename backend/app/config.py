@@ -2,10 +2,15 @@
 TraceBridge AI - Configuration Management
 """
 
+from pathlib import Path
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Literal, Optional
 import os
 
+# Backend root; relative cache paths resolve here rather than against the CWD
+BASE_DIR = Path(__file__).resolve().parent.parent
+
 
 class Settings(BaseSettings):
     """Application settings loaded from environment variables."""
@@ -14,13 +19,20 @@ class Settings(BaseSettings):
     openai_api_key: Optional[str] = None
     embedding_model: str = "text-embedding-3-small"
     llm_model: str = "gpt-4o-mini"
+    embedding_batch_size: int = 128  # Local model encode batch size
     
     # ChromaDB Configuration
     chroma_persist_dir: str = "./chroma_db"
+    embedding_dtype: Literal["float32", "float16", "int8"] = "float32"  # Stored vector precision
     
     # Upload Configuration
     upload_dir: str = "./data/uploads"
     
+    # Parsed Document Cache Configuration
+    parse_cache_enabled: bool = True
+    parse_cache_dir: str = "./data/parse_cache"
+    parse_cache_max_entries: int = 256
+    
     # Chunking Configuration
     chunk_size: int = 500
     chunk_overlap: int = 50
@@ -28,6 +40,27 @@ class Settings(BaseSettings):
     # ChromaDB Collection Name
     collection_name: str = "tracebridge_documents"
     
+    # Embedding Cache Configuration
+    embedding_cache_enabled: bool = True
+    embedding_cache_dir: str = "./data/embedding_cache"
+    query_embedding_cache_size: int = 4096  # 0 disables
+    
+    # Query Result Cache Configuration (exact query text)
+    query_cache_enabled: bool = True
+    query_cache_ttl: int = 300  # seconds
+    query_cache_size: int = 256  # 0 disables
+    
+    # LLM Response Cache Configuration
+    llm_cache_size: int = 256  # 0 disables
+    llm_cache_ttl: int = 3600  # seconds
+    
+    @field_validator("parse_cache_dir", "embedding_cache_dir")
+    @classmethod
+    def resolve_cache_dir(cls, value: str) -> str:
+        """Anchor relative cache directories to the backend root."""
+        path = Path(value)
+        return str(path if path.is_absolute() else (BASE_DIR / path).resolve())
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
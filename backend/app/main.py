@@ -5,15 +5,20 @@ Main application entry point for Milestone 2.
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+import asyncio
 import logging
 
 from app.config import settings
 from app.routers import documents, query
+from app.services.embeddings import get_embeddings_async
+from app.services.parser import close_parser_pool
+from app.services.vector_store import close_vector_store, list_documents
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    format="%(created).3f - %(name)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
@@ -27,7 +32,8 @@ app = FastAPI(
     ),
     version="0.2.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -35,9 +41,11 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=[
         "http://localhost:5173",
-        "https://tracebridge.vercel.app",
-        "https://*.vercel.app"
+        "https://tracebridge.vercel.app"
     ],  # In production, specify allowed origins
+    # This project's Vercel preview deployments only; allow_origins does not
+    # expand wildcards, and with credentials any *.vercel.app tenant is too broad
+    allow_origin_regex=r"https://tracebridge(-[a-z0-9-]+)?\.vercel\.app",
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -68,6 +76,20 @@ async def startup_event():
     logger.info(f"Upload directory: {settings.upload_dir}")
     logger.info(f"Chunk size: {settings.chunk_size}, overlap: {settings.chunk_overlap}")
     
+    loop = asyncio.get_running_loop()
+    logger.info(f"Event loop: {type(loop).__module__}.{type(loop).__name__}")
+    
+    # Warm up so the first request doesn't pay for model loading or
+    # opening the vector store. OpenAI embeddings have no model to load,
+    # and a warm-up request would be billed on every boot.
+    try:
+        if not settings.use_openai_embeddings:
+            await get_embeddings_async(["warmup"])
+        documents = await asyncio.to_thread(list_documents)
+        logger.info(f"Warmed up embeddings and vector store ({len(documents)} documents)")
+    except Exception as e:
+        logger.warning(f"Warm-up failed, services will initialize on first use: {e}")
+    
     logger.info("TraceBridge AI started successfully!")
 
 
@@ -75,6 +97,8 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown."""
     logger.info("Shutting down TraceBridge AI...")
+    close_parser_pool()
+    close_vector_store()
 
 
 @app.get("/", tags=["health"])
@@ -5,6 +5,8 @@ Handles document upload, listing, and deletion with extended metadata.
 
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from typing import List, Optional
+import asyncio
+import glob
 import os
 import uuid
 import shutil
@@ -19,13 +21,12 @@ from app.models import (
     ErrorResponse,
     DocType
 )
-from app.services.parser import parse_document
-from app.services.chunker import chunk_document
+from app.services.parser import parse_document_async
+from app.services.chunker import chunk_document_async
 from app.services.vector_store import (
-    index_chunks,
+    index_chunks_async,
     list_documents,
     delete_document,
-    document_exists,
     get_document_chunk_count
 )
 from app.services.metadata_extractor import aggregate_standards_from_chunks
@@ -37,6 +38,9 @@ router = APIRouter(prefix="", tags=["documents"])
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {".pdf", ".docx"}
 
+# Buffer size used when streaming uploads to disk
+UPLOAD_CHUNK_SIZE = 1 << 20
+
 
 def get_file_extension(filename: str) -> str:
     """Get lowercase file extension."""
@@ -48,6 +52,12 @@ def validate_file_type(filename: str) -> bool:
     return get_file_extension(filename) in ALLOWED_EXTENSIONS
 
 
+def save_upload(file: UploadFile, file_path: str):
+    """Stream an uploaded file to disk in fixed-size chunks."""
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer, UPLOAD_CHUNK_SIZE)
+
+
 @router.post(
     "/upload",
     response_model=UploadResponse,
@@ -99,23 +109,22 @@ async def upload_document(
     file_path = os.path.join(settings.upload_dir, safe_filename)
     
     try:
-        # Save uploaded file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Save uploaded file without blocking the event loop
+        await asyncio.to_thread(save_upload, file, file_path)
         
         logger.info(f"Saved uploaded file: {file_path}")
         
         # Parse the document
-        parsed_doc = parse_document(file_path)
+        parsed_doc = await parse_document_async(file_path)
         
-        if not parsed_doc.pages:
+        if not parsed_doc.page_count:
             raise HTTPException(
                 status_code=400,
                 detail="Document appears to be empty or could not be parsed"
             )
         
-        # Chunk the document with metadata extraction
-        chunks = chunk_document(
+        # Chunk the document with metadata extraction in the process pool
+        chunks = await chunk_document_async(
             doc=parsed_doc,
             doc_id=doc_id,
             device_name=device_name,
@@ -132,11 +141,11 @@ async def upload_document(
         
         # Aggregate detected standards
         standards_detected = aggregate_standards_from_chunks(
-            [{"standards_referenced": c.metadata.standards_referenced} for c in chunks]
+            c.metadata.standards_referenced for c in chunks
         )
         
         # Index chunks in vector store
-        chunks_indexed = index_chunks(
+        chunks_indexed = await index_chunks_async(
             chunks=chunks,
             doc_id=doc_id,
             filename=file.filename,
@@ -217,22 +226,22 @@ async def delete_document_endpoint(doc_id: str):
     The original uploaded file is also deleted if it exists.
     """
     try:
-        # Check if document exists
-        if not document_exists(doc_id):
+        # Delete from vector store; nothing deleted means it never existed
+        chunks_deleted = delete_document(doc_id)
+        if chunks_deleted == 0:
             raise HTTPException(
                 status_code=404,
                 detail=f"Document not found: {doc_id}"
             )
         
-        # Delete from vector store
-        chunks_deleted = delete_document(doc_id)
-        
-        # Try to delete original file
-        for ext in ALLOWED_EXTENSIONS:
-            file_path = os.path.join(settings.upload_dir, f"{doc_id}{ext}")
-            if os.path.exists(file_path):
+        # Try to delete original file (one directory scan, whatever its extension)
+        pattern = os.path.join(settings.upload_dir, f"{glob.escape(doc_id)}.*")
+        for file_path in glob.iglob(pattern):
+            try:
                 os.remove(file_path)
                 logger.info(f"Deleted file: {file_path}")
+            except FileNotFoundError:
+                pass
         
         return DeleteResponse(
             success=True,
@@ -4,6 +4,7 @@ Handles RAG queries and gap report generation.
 """
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse
 from datetime import datetime
 import logging
 
@@ -16,6 +17,7 @@ from app.models import (
 )
 from app.services.vector_store import query_chunks
 from app.services.llm import (
+    format_sources_for_prompt,
     generate_grounded_answer,
     verify_answer,
     extract_citations
@@ -67,19 +69,23 @@ async def query_documents(request: QueryRequest):
         
         logger.info(f"Query '{request.query[:50]}...' returned {len(chunks)} chunks")
         
+        # Format the sources once for both the answer and verification prompts
+        sources_text = format_sources_for_prompt(chunks)
+        
         # Generate grounded answer
         answer, fallback_used = generate_grounded_answer(
             query=request.query,
-            chunks=chunks
+            chunks=chunks,
+            sources_text=sources_text
         )
         
         # Verify answer grounding
-        verification = verify_answer(answer, chunks)
+        verification = verify_answer(answer, chunks, sources_text=sources_text)
         
         # Extract citations
         citations = extract_citations(chunks)
         
-        return QueryResponse(
+        response = QueryResponse(
             success=True,
             query=request.query,
             answer=answer,
@@ -88,6 +94,10 @@ async def query_documents(request: QueryRequest):
             verification=verification
         )
         
+        # Already validated: return it directly so FastAPI skips re-validating
+        # against response_model, which is kept for the OpenAPI schema
+        return ORJSONResponse(response.model_dump(mode="json"))
+        
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
         raise HTTPException(
@@ -137,7 +147,7 @@ async def create_gap_report(request: GapReportRequest):
             f"({request.focus_area}): {len(gaps)} gaps found"
         )
         
-        return GapReportResponse(
+        response = GapReportResponse(
             success=True,
             device_name=request.device_name,
             focus_area=request.focus_area,
@@ -146,6 +156,8 @@ async def create_gap_report(request: GapReportRequest):
             generated_at=datetime.utcnow().isoformat()
         )
         
+        return ORJSONResponse(response.model_dump(mode="json"))
+        
     except Exception as e:
         logger.error(f"Error generating gap report: {str(e)}")
         raise HTTPException(
@@ -3,16 +3,60 @@ TraceBridge AI - Text Chunking Service
 Handles text chunking with overlap and metadata extraction.
 """
 
-from typing import List, Optional
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from functools import partial
+from typing import List, Optional, Tuple
 from uuid import uuid4
+import asyncio
 import logging
+import re
 
-from app.models import Chunk, ChunkMetadata, DocType
-from app.services.parser import ParsedDocument, ParsedPage
+from app.models import DocType
+from app.services.parser import ParsedDocument, get_parser_pool
 from app.services.metadata_extractor import extract_all_metadata
 
 logger = logging.getLogger(__name__)
 
+# Candidate chunk boundaries, matched at the first boundary character
+_PARAGRAPH_BREAK_RE = re.compile(r"\n(?=\n)")
+_SENTENCE_BREAK_RE = re.compile(r"[.!?](?=[ \n])")
+_WORD_BREAK_RE = re.compile(r" ")
+
+# Joins page texts when a document is chunked as one stream; doubles as a
+# paragraph break so chunks prefer to end at page boundaries
+PAGE_DELIMITER = "\n\n"
+
+
+@dataclass(slots=True)
+class ChunkRecordMetadata:
+    """
+    Metadata for a text chunk.
+    
+    Mirrors app.models.ChunkMetadata as a slotted dataclass: chunks never
+    leave the service layer, so they skip Pydantic construction entirely.
+    """
+    doc_id: str
+    filename: str
+    chunk_id: str
+    page_number: Optional[int]
+    chunk_index: int
+    # Extended metadata
+    device_name: Optional[str] = None
+    doc_type: DocType = "other"
+    standards_referenced: List[str] = field(default_factory=list)
+    section_heading: Optional[str] = None
+    requirement_ids: List[str] = field(default_factory=list)
+    test_case_ids: List[str] = field(default_factory=list)
+    risk_ids: List[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class ChunkRecord:
+    """A text chunk with its metadata."""
+    text: str
+    metadata: ChunkRecordMetadata
+
 
 def chunk_text(
     text: str,
@@ -36,9 +80,30 @@ def chunk_text(
     # Clean the text
     text = text.strip()
     
+    return [chunk for _, chunk in _chunk_with_offsets(text, chunk_size, chunk_overlap)]
+
+
+def _chunk_with_offsets(
+    text: str,
+    chunk_size: int,
+    chunk_overlap: int
+) -> List[Tuple[int, str]]:
+    """
+    Split stripped text into overlapping chunks.
+    
+    Returns:
+        List of (offset of the chunk's first character in text, chunk text)
+    """
     # If text is smaller than chunk size, return as single chunk
     if len(text) <= chunk_size:
-        return [text]
+        return [(0, text)]
+    
+    # Precompute every candidate boundary once; each window then only
+    # needs a binary search instead of repeated rfind scans.
+    para_starts = [m.start() for m in _PARAGRAPH_BREAK_RE.finditer(text)]
+    sent_starts = [m.start() for m in _SENTENCE_BREAK_RE.finditer(text)]
+    # Word breaks are rarely needed, so only collect them on first use
+    space_starts: Optional[List[int]] = None
     
     chunks = []
     start = 0
@@ -49,27 +114,31 @@ def chunk_text(
         
         # If we're not at the end, try to break at a natural boundary
         if end < len(text):
+            min_break = start + chunk_size // 2
+            
             # Try to find a paragraph break
-            para_break = text.rfind("\n\n", start, end)
-            if para_break > start + chunk_size // 2:
-                end = para_break + 2  # Include the newlines
+            i = bisect_right(para_starts, end - 2) - 1
+            if i >= 0 and para_starts[i] > min_break:
+                end = para_starts[i] + 2  # Include the newlines
             else:
-                # Try to find a sentence break
-                for sep in [". ", ".\n", "! ", "!\n", "? ", "?\n"]:
-                    sent_break = text.rfind(sep, start + chunk_size // 2, end)
-                    if sent_break > start:
-                        end = sent_break + len(sep)
-                        break
+                # Try to find a sentence break: the latest '.', '!' or '?'
+                # boundary wins, rather than trying each terminator in turn
+                i = bisect_right(sent_starts, end - 2) - 1
+                if i >= 0 and sent_starts[i] >= min_break:
+                    end = sent_starts[i] + 2
                 else:
                     # Try to find a word break
-                    space = text.rfind(" ", start + chunk_size // 2, end)
-                    if space > start:
-                        end = space + 1
+                    if space_starts is None:
+                        space_starts = [m.start() for m in _WORD_BREAK_RE.finditer(text)]
+                    i = bisect_right(space_starts, end - 1) - 1
+                    if i >= 0 and space_starts[i] >= min_break:
+                        end = space_starts[i] + 1
         
         # Extract the chunk
-        chunk = text[start:end].strip()
+        window = text[start:end]
+        chunk = window.strip()
         if chunk:
-            chunks.append(chunk)
+            chunks.append((start + len(window) - len(window.lstrip()), chunk))
         
         # Move start position, accounting for overlap
         new_start = end - chunk_overlap
@@ -90,7 +159,7 @@ def chunk_document(
     doc_type: DocType = "other",
     chunk_size: int = 500,
     chunk_overlap: int = 50
-) -> List[Chunk]:
+) -> List[ChunkRecord]:
     """
     Chunk a parsed document while preserving page metadata and extracting
     standards, requirement IDs, test IDs, and risk IDs.
@@ -104,53 +173,91 @@ def chunk_document(
         chunk_overlap: Overlap between chunks
         
     Returns:
-        List of Chunk objects with metadata
+        List of ChunkRecord objects with metadata
     """
     all_chunks = []
-    chunk_index = 0
     
-    for page in doc.pages:
-        if not page.text or not page.text.strip():
+    # Chunk the whole document as one stream so chunks can continue across
+    # page breaks, remembering where each page starts to recover page numbers
+    page_texts = []
+    page_numbers = []
+    page_starts = []
+    offset = 0
+    for page_text, page_number in zip(doc.texts, doc.page_numbers):
+        page_text = page_text.strip() if page_text else ""
+        if not page_text:
             continue
+        page_texts.append(page_text)
+        page_numbers.append(page_number)
+        page_starts.append(offset)
+        offset += len(page_text) + len(PAGE_DELIMITER)
+    
+    full_text = PAGE_DELIMITER.join(page_texts)
+    text_chunks = _chunk_with_offsets(full_text, chunk_size, chunk_overlap) if full_text else []
+    
+    for chunk_index, (chunk_start, text) in enumerate(text_chunks):
+        chunk_id = f"{doc_id}_chunk_{chunk_index}"
         
-        # Chunk the page text
-        text_chunks = chunk_text(
-            page.text,
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap
-        )
+        # A chunk is attributed to the page it starts on
+        page_number = page_numbers[bisect_right(page_starts, chunk_start) - 1]
         
-        for text in text_chunks:
-            chunk_id = f"{doc_id}_chunk_{chunk_index}"
-            
-            # Extract metadata from chunk text
-            extracted = extract_all_metadata(text)
-            
-            chunk = Chunk(
-                text=text,
-                metadata=ChunkMetadata(
-                    doc_id=doc_id,
-                    filename=doc.filename,
-                    chunk_id=chunk_id,
-                    page_number=page.page_number,
-                    chunk_index=chunk_index,
-                    # Extended metadata
-                    device_name=device_name,
-                    doc_type=doc_type,
-                    standards_referenced=extracted["standards_referenced"],
-                    section_heading=extracted["section_heading"],
-                    requirement_ids=extracted["requirement_ids"],
-                    test_case_ids=extracted["test_case_ids"],
-                    risk_ids=extracted["risk_ids"],
-                )
+        # Extract metadata from chunk text
+        extracted = extract_all_metadata(text)
+        
+        chunk = ChunkRecord(
+            text=text,
+            metadata=ChunkRecordMetadata(
+                doc_id=doc_id,
+                filename=doc.filename,
+                chunk_id=chunk_id,
+                page_number=page_number,
+                chunk_index=chunk_index,
+                # Extended metadata
+                device_name=device_name,
+                doc_type=doc_type,
+                standards_referenced=extracted["standards_referenced"],
+                section_heading=extracted["section_heading"],
+                requirement_ids=extracted["requirement_ids"],
+                test_case_ids=extracted["test_case_ids"],
+                risk_ids=extracted["risk_ids"],
             )
-            
-            all_chunks.append(chunk)
-            chunk_index += 1
+        )
+        
+        all_chunks.append(chunk)
     
     logger.info(
         f"Chunked document '{doc.filename}' (doc_id={doc_id}): "
-        f"{len(all_chunks)} chunks from {len(doc.pages)} pages"
+        f"{len(all_chunks)} chunks from {doc.page_count} pages"
     )
     
     return all_chunks
+
+
+async def chunk_document_async(
+    doc: ParsedDocument,
+    doc_id: str,
+    device_name: Optional[str] = None,
+    doc_type: DocType = "other",
+    chunk_size: int = 500,
+    chunk_overlap: int = 50
+) -> List[ChunkRecord]:
+    """
+    Chunk a document in the parser process pool without blocking the event loop.
+    
+    Chunking and metadata extraction are pure-Python CPU work, so running
+    them in a worker process keeps them off the GIL shared with the event
+    loop and embedding.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_parser_pool(),
+        partial(
+            chunk_document,
+            doc,
+            doc_id,
+            device_name=device_name,
+            doc_type=doc_type,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
+        )
+    )
@@ -0,0 +1,209 @@
+"""
+TraceBridge AI - Embedding Cache Service
+Persistent content-addressed cache of embedding vectors, plus an in-memory
+LRU for query embeddings.
+"""
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    On-disk cache mapping chunk text to its embedding vector.
+    
+    Keys are blake2b digests of the model id and the text, so switching
+    embedding models never returns stale vectors. Vectors live in a single
+    growable float32 memory-mapped file; a small sqlite index maps each key
+    to its row.
+    """
+    
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self._vec_path = os.path.join(path, "vecs.f32")
+        self._lock = threading.Lock()
+        
+        self._db = sqlite3.connect(
+            os.path.join(path, "index.sqlite"),
+            check_same_thread=False
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS cache(key BLOB PRIMARY KEY, row INTEGER)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta(name TEXT PRIMARY KEY, value INTEGER)")
+        self._db.commit()
+        
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        self._dim: Optional[int] = row[0] if row else None
+        self._rows: int = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        self._vecs: Optional[np.memmap] = None
+        
+        if self._dim and os.path.exists(self._vec_path):
+            self._map(os.path.getsize(self._vec_path) // (self._dim * 4))
+    
+    @staticmethod
+    def _key(text: str, model_id: str) -> bytes:
+        """Content hash of a text for a given embedding model."""
+        return hashlib.blake2b(
+            f"{model_id}\x00{text}".encode("utf-8"),
+            digest_size=16
+        ).digest()
+    
+    def _map(self, capacity: int):
+        """(Re)open the vector file as a memmap of the given row capacity."""
+        self._vecs = np.memmap(
+            self._vec_path, dtype=np.float32, mode="r+",
+            shape=(capacity, self._dim)
+        )
+    
+    def _reserve(self, n: int):
+        """Grow the vector file geometrically to hold n more rows."""
+        capacity = self._vecs.shape[0] if self._vecs is not None else 0
+        if self._rows + n <= capacity:
+            return
+        
+        new_capacity = max(2 * capacity, self._rows + n, 1024)
+        if self._vecs is not None:
+            self._vecs.flush()
+            self._vecs = None
+        with open(self._vec_path, "ab") as f:
+            f.truncate(new_capacity * self._dim * 4)
+        self._map(new_capacity)
+    
+    def get_many(
+        self,
+        texts: Sequence[str],
+        model_id: str
+    ) -> Tuple[Dict[int, np.ndarray], List[int]]:
+        """
+        Look up cached embeddings.
+        
+        Args:
+            texts: Texts to look up
+            model_id: Identifier of the embedding model
+        
+        Returns:
+            Tuple of (hits mapping text index -> vector, indices of misses)
+        """
+        if not texts or self._vecs is None:
+            return {}, list(range(len(texts)))
+        
+        keys = [self._key(text, model_id) for text in texts]
+        rows: Dict[bytes, int] = {}
+        
+        with self._lock:
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i:i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows.update(self._db.execute(
+                    f"SELECT key, row FROM cache WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall())
+            
+            hits = {}
+            misses = []
+            for i, key in enumerate(keys):
+                if key in rows:
+                    hits[i] = np.array(self._vecs[rows[key]])
+                else:
+                    misses.append(i)
+        
+        return hits, misses
+    
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]], model_id: str):
+        """
+        Store embeddings for the given texts.
+        
+        Args:
+            texts: Texts that were embedded
+            vectors: Embedding vectors, aligned with texts
+            model_id: Identifier of the embedding model
+        """
+        if not texts:
+            return
+        
+        vecs = np.asarray(vectors, dtype=np.float32)
+        
+        with self._lock:
+            if self._dim is None:
+                self._dim = int(vecs.shape[1])
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (self._dim,))
+            elif vecs.shape[1] != self._dim:
+                logger.warning(
+                    f"Not caching {len(texts)} embeddings: dimension {vecs.shape[1]} "
+                    f"does not match cache dimension {self._dim}"
+                )
+                return
+            
+            # Skip texts already cached (e.g. duplicates within the batch)
+            new_keys: Dict[bytes, int] = {}
+            for i, text in enumerate(texts):
+                new_keys.setdefault(self._key(text, model_id), i)
+            existing = set()
+            keys = list(new_keys)
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i:i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                existing.update(k for (k,) in self._db.execute(
+                    f"SELECT key FROM cache WHERE key IN ({placeholders})", batch
+                ))
+            to_add = [(k, i) for k, i in new_keys.items() if k not in existing]
+            if not to_add:
+                return
+            
+            self._reserve(len(to_add))
+            start = self._rows
+            self._vecs[start:start + len(to_add)] = vecs[[i for _, i in to_add]]
+            self._vecs.flush()
+            
+            self._db.executemany(
+                "INSERT INTO cache(key, row) VALUES (?, ?)",
+                [(k, start + n) for n, (k, _) in enumerate(to_add)]
+            )
+            self._db.commit()
+            self._rows += len(to_add)
+
+
+class QueryEmbeddingCache:
+    """
+    In-memory LRU of query embeddings keyed by exact query text.
+    
+    Repeated queries skip the embedding model (an OpenAI round trip or a
+    local forward pass) entirely.
+    """
+    
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, text: str, model_id: str) -> Optional[np.ndarray]:
+        """Return a copy of the cached embedding for text, if present."""
+        key = EmbeddingCache._key(text, model_id)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                return None
+            self._entries.move_to_end(key)
+        return embedding.copy()
+    
+    def put(self, text: str, embedding: Sequence[float], model_id: str):
+        """Cache the embedding for text, evicting the least recently used."""
+        if self.max_entries <= 0:
+            return
+        key = EmbeddingCache._key(text, model_id)
+        with self._lock:
+            self._entries[key] = np.array(embedding, dtype=np.float32)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
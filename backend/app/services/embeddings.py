@@ -3,38 +3,91 @@ TraceBridge AI - Embeddings Service
 Handles embedding generation using OpenAI or local sentence-transformers.
 """
 
+from functools import lru_cache
 from typing import List, Optional
+import asyncio
 import logging
 
+import numpy as np
+
 from app.config import settings
+from app.services.embedding_cache import QueryEmbeddingCache
 
 logger = logging.getLogger(__name__)
 
-# Global embedding model instance (lazy loaded)
-_local_model = None
-_openai_client = None
+# Local sentence-transformers model name
+LOCAL_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# OpenAI embeddings request limits
+OPENAI_MAX_BATCH_INPUTS = 2048
+OPENAI_MAX_BATCH_TOKENS = 300_000
+# Conservative characters-per-token estimate used to stay under the token cap
+_CHARS_PER_TOKEN = 3
+# Maximum concurrent OpenAI embedding requests per call
+OPENAI_MAX_CONCURRENT_REQUESTS = 8
 
+# Exact-text LRU of query embeddings
+_query_embedding_cache = QueryEmbeddingCache(settings.query_embedding_cache_size)
 
+
+@lru_cache(maxsize=1)
 def _get_local_model():
     """Lazy load the local sentence-transformers model."""
-    global _local_model
-    if _local_model is None:
-        from sentence_transformers import SentenceTransformer
-        logger.info("Loading local embedding model: all-MiniLM-L6-v2")
-        _local_model = SentenceTransformer('all-MiniLM-L6-v2')
-    return _local_model
+    from sentence_transformers import SentenceTransformer
+    logger.info(f"Loading local embedding model: {LOCAL_EMBEDDING_MODEL}")
+    return SentenceTransformer(LOCAL_EMBEDDING_MODEL)
 
 
+@lru_cache(maxsize=1)
 def _get_openai_client():
     """Lazy load the OpenAI client."""
-    global _openai_client
-    if _openai_client is None:
-        from openai import OpenAI
-        _openai_client = OpenAI(api_key=settings.openai_api_key)
-    return _openai_client
+    from openai import OpenAI
+    return OpenAI(api_key=settings.openai_api_key)
+
 
+@lru_cache(maxsize=1)
+def _get_async_openai_client():
+    """Lazy load the async OpenAI client."""
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=settings.openai_api_key)
 
-def get_embeddings_openai(texts: List[str]) -> List[List[float]]:
+
+def _no_embeddings() -> np.ndarray:
+    """Empty embedding matrix returned for empty input."""
+    return np.empty((0, 0), dtype=np.float32)
+
+
+def get_embedding_model_id() -> str:
+    """Identifier of the embedding model currently in use."""
+    if settings.use_openai_embeddings:
+        return settings.embedding_model
+    return LOCAL_EMBEDDING_MODEL
+
+
+def _openai_batches(texts: List[str]) -> List[List[str]]:
+    """Split texts into the fewest requests allowed by the OpenAI limits."""
+    batches = []
+    batch: List[str] = []
+    batch_tokens = 0
+    
+    for text in texts:
+        tokens = len(text) // _CHARS_PER_TOKEN + 1
+        if batch and (
+            len(batch) >= OPENAI_MAX_BATCH_INPUTS
+            or batch_tokens + tokens > OPENAI_MAX_BATCH_TOKENS
+        ):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(text)
+        batch_tokens += tokens
+    
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def get_embeddings_openai(texts: List[str]) -> np.ndarray:
     """
     Generate embeddings using OpenAI API.
     
@@ -42,20 +95,17 @@ def get_embeddings_openai(texts: List[str]) -> List[List[float]]:
         texts: List of texts to embed
         
     Returns:
-        List of embedding vectors
+        float32 array of shape (len(texts), dim)
     """
     if not texts:
-        return []
+        return _no_embeddings()
     
     client = _get_openai_client()
     
-    # OpenAI has a limit on batch size, process in batches
-    batch_size = 100
+    # Pack as many inputs per request as the API allows
     all_embeddings = []
     
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i + batch_size]
-        
+    for batch in _openai_batches(texts):
         response = client.embeddings.create(
             model=settings.embedding_model,
             input=batch
@@ -66,10 +116,42 @@ def get_embeddings_openai(texts: List[str]) -> List[List[float]]:
         all_embeddings.extend(batch_embeddings)
     
     logger.info(f"Generated {len(all_embeddings)} embeddings using OpenAI ({settings.embedding_model})")
-    return all_embeddings
+    return np.asarray(all_embeddings, dtype=np.float32)
+
+
+async def get_embeddings_openai_async(texts: List[str]) -> np.ndarray:
+    """
+    Generate embeddings using OpenAI API, issuing batch requests concurrently.
+    
+    Args:
+        texts: List of texts to embed
+        
+    Returns:
+        float32 array of shape (len(texts), dim)
+    """
+    if not texts:
+        return _no_embeddings()
+    
+    client = _get_async_openai_client()
+    semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENT_REQUESTS)
+    
+    async def embed_batch(batch: List[str]) -> List[List[float]]:
+        async with semaphore:
+            response = await client.embeddings.create(
+                model=settings.embedding_model,
+                input=batch
+            )
+        return [item.embedding for item in response.data]
+    
+    # gather preserves batch order
+    results = await asyncio.gather(*(embed_batch(batch) for batch in _openai_batches(texts)))
+    all_embeddings = [embedding for batch in results for embedding in batch]
+    
+    logger.info(f"Generated {len(all_embeddings)} embeddings using OpenAI ({settings.embedding_model})")
+    return np.asarray(all_embeddings, dtype=np.float32)
 
 
-def get_embeddings_local(texts: List[str]) -> List[List[float]]:
+def get_embeddings_local(texts: List[str]) -> np.ndarray:
     """
     Generate embeddings using local sentence-transformers model.
     
@@ -77,24 +159,27 @@ def get_embeddings_local(texts: List[str]) -> List[List[float]]:
         texts: List of texts to embed
         
     Returns:
-        List of embedding vectors
+        float32 array of shape (len(texts), dim)
     """
     if not texts:
-        return []
+        return _no_embeddings()
     
     model = _get_local_model()
     
-    # Generate embeddings
-    embeddings = model.encode(texts, convert_to_numpy=True)
+    # Generate embeddings, normalized inside the model's forward pass
+    embeddings = model.encode(
+        texts,
+        batch_size=settings.embedding_batch_size,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    ).astype(np.float32, copy=False)
     
-    # Convert to list of lists
-    embeddings_list = embeddings.tolist()
-    
-    logger.info(f"Generated {len(embeddings_list)} embeddings using local model")
-    return embeddings_list
+    logger.info(f"Generated {len(embeddings)} embeddings using local model")
+    return embeddings
 
 
-def get_embeddings(texts: List[str]) -> List[List[float]]:
+def get_embeddings(texts: List[str]) -> np.ndarray:
     """
     Generate embeddings using the configured method (OpenAI or local).
     
@@ -102,10 +187,10 @@ def get_embeddings(texts: List[str]) -> List[List[float]]:
         texts: List of texts to embed
         
     Returns:
-        List of embedding vectors
+        float32 array of shape (len(texts), dim)
     """
     if not texts:
-        return []
+        return _no_embeddings()
     
     if settings.use_openai_embeddings:
         logger.info("Using OpenAI embeddings")
@@ -115,9 +200,34 @@ def get_embeddings(texts: List[str]) -> List[List[float]]:
         return get_embeddings_local(texts)
 
 
-def get_embedding(text: str) -> List[float]:
+async def get_embeddings_async(texts: List[str]) -> np.ndarray:
+    """
+    Generate embeddings without blocking the event loop.
+    
+    OpenAI batches are requested concurrently; the local model runs in a
+    worker thread.
+    
+    Args:
+        texts: List of texts to embed
+        
+    Returns:
+        float32 array of shape (len(texts), dim)
+    """
+    if not texts:
+        return _no_embeddings()
+    
+    if settings.use_openai_embeddings:
+        logger.info("Using OpenAI embeddings")
+        return await get_embeddings_openai_async(texts)
+    else:
+        logger.info("Using local embeddings (sentence-transformers)")
+        return await asyncio.to_thread(get_embeddings_local, texts)
+
+
+def get_embedding(text: str) -> np.ndarray:
     """
-    Generate embedding for a single text.
+    Generate embedding for a single text, reusing the cached embedding
+    when the same text was embedded recently.
     
     Args:
         text: Text to embed
@@ -125,5 +235,38 @@ def get_embedding(text: str) -> List[float]:
     Returns:
         Embedding vector
     """
-    embeddings = get_embeddings([text])
-    return embeddings[0] if embeddings else []
+    model_id = get_embedding_model_id()
+    cached = _query_embedding_cache.get(text, model_id)
+    if cached is not None:
+        return cached
+    
+    embedding = get_embeddings([text])[0]
+    _query_embedding_cache.put(text, embedding, model_id)
+    return embedding
+
+
+def get_query_embeddings(texts: List[str]) -> np.ndarray:
+    """
+    Generate embeddings for several queries with one model call, reusing
+    cached embeddings for queries seen recently.
+    
+    Args:
+        texts: Texts to embed
+        
+    Returns:
+        float32 array of shape (len(texts), dim)
+    """
+    if not texts:
+        return _no_embeddings()
+    
+    model_id = get_embedding_model_id()
+    cached = [_query_embedding_cache.get(text, model_id) for text in texts]
+    misses = [i for i, embedding in enumerate(cached) if embedding is None]
+    
+    if misses:
+        miss_embeddings = get_embeddings([texts[i] for i in misses])
+        for i, embedding in zip(misses, miss_embeddings):
+            cached[i] = embedding
+            _query_embedding_cache.put(texts[i], embedding, model_id)
+    
+    return np.stack(cached)
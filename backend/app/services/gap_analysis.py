@@ -3,13 +3,15 @@ TraceBridge AI - Gap Analysis Service
 Generates structured gap reports comparing FDA requirements vs user evidence.
 """
 
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
 from app.config import settings
 from app.models import GapItem, Citation
-from app.services.vector_store import query_chunks
+from app.services.vector_store import query_chunks_batch
 from app.services.llm import generate_grounded_answer, extract_citations
 
 logger = logging.getLogger(__name__)
@@ -142,6 +144,34 @@ COST_ESTIMATES = {
 }
 
 
+# Remediation step templates, shared by every gap they apply to
+TEST_REMEDIATION_STEPS = (
+    "Review existing test documentation",
+    "Create or update test protocol",
+    "Execute required tests",
+    "Document results with pass/fail conclusions"
+)
+TRACEABILITY_REMEDIATION_STEPS = (
+    "Create requirements traceability matrix",
+    "Link requirements to design elements",
+    "Link design elements to verification activities",
+    "Verify complete coverage"
+)
+RISK_REMEDIATION_STEPS = (
+    "Review risk management file",
+    "Perform hazard analysis if missing",
+    "Document risk controls",
+    "Verify risk control effectiveness"
+)
+DOCUMENT_REMEDIATION_STEPS = (
+    "Review FDA guidance for document requirements",
+    "Create document outline",
+    "Complete required sections",
+    "Review and approve"
+)
+
+
+@lru_cache(maxsize=256)
 def determine_severity(requirement: str) -> str:
     """Determine severity based on requirement keywords."""
     req_lower = requirement.lower()
@@ -153,49 +183,55 @@ def determine_severity(requirement: str) -> str:
     return "medium"
 
 
-def generate_remediation_steps(requirement: str, severity: str) -> List[str]:
+@lru_cache(maxsize=256)
+def generate_remediation_steps(requirement: str, severity: str) -> Tuple[str, ...]:
     """Generate remediation steps based on requirement."""
     req_lower = requirement.lower()
     
-    steps = []
-    
     if "test" in req_lower:
-        steps.extend([
-            "Review existing test documentation",
-            "Create or update test protocol",
-            "Execute required tests",
-            "Document results with pass/fail conclusions"
-        ])
+        return TEST_REMEDIATION_STEPS
     elif "traceability" in req_lower:
-        steps.extend([
-            "Create requirements traceability matrix",
-            "Link requirements to design elements",
-            "Link design elements to verification activities",
-            "Verify complete coverage"
-        ])
+        return TRACEABILITY_REMEDIATION_STEPS
     elif "risk" in req_lower:
-        steps.extend([
-            "Review risk management file",
-            "Perform hazard analysis if missing",
-            "Document risk controls",
-            "Verify risk control effectiveness"
-        ])
+        return RISK_REMEDIATION_STEPS
     elif "plan" in req_lower or "documentation" in req_lower:
-        steps.extend([
-            "Review FDA guidance for document requirements",
-            "Create document outline",
-            "Complete required sections",
-            "Review and approve"
-        ])
+        return DOCUMENT_REMEDIATION_STEPS
     else:
-        steps.extend([
+        return (
             f"Review FDA requirements for: {requirement}",
             "Assess current documentation gaps",
             "Create or update required documentation",
             "Obtain appropriate review and approval"
-        ])
+        )
+
+
+def _build_requirement_table() -> Dict[str, List[Tuple[str, str, str, str, str, Tuple[str, ...]]]]:
+    """
+    Precompute the rules-based assessment of every requirement.
     
-    return steps
+    Returns:
+        Focus area -> list of (area, requirement, severity, timeline, cost,
+        remediation steps)
+    """
+    table = {}
+    for focus_area, area_groups in FDA_REQUIREMENTS.items():
+        table[focus_area] = []
+        for area_group in area_groups:
+            for requirement in area_group["requirements"]:
+                severity = determine_severity(requirement)
+                table[focus_area].append((
+                    area_group["area"],
+                    requirement,
+                    severity,
+                    TIMELINE_ESTIMATES[severity],
+                    COST_ESTIMATES[severity],
+                    generate_remediation_steps(requirement, severity),
+                ))
+    return table
+
+
+# Every requirement per focus area with its rules-based assessment precomputed
+REQUIREMENT_TABLE = _build_requirement_table()
 
 
 async def generate_gap_report(
@@ -217,51 +253,47 @@ async def generate_gap_report(
     gaps = []
     
     # Get requirements for focus area
-    area_requirements = FDA_REQUIREMENTS.get(focus_area, FDA_REQUIREMENTS["General"])
+    checks = REQUIREMENT_TABLE.get(focus_area, REQUIREMENT_TABLE["General"])
     
-    for area_group in area_requirements:
-        area_name = area_group["area"]
+    # Search for evidence of every requirement in one batch, off the event loop
+    all_chunks = await asyncio.to_thread(
+        query_chunks_batch,
+        queries=[f"{check[1]} for {device_name}" for check in checks],
+        device_name=device_name if device_name else None,
+        top_k=3
+    )
+    
+    for check, chunks in zip(checks, all_chunks):
+        area_name, requirement, severity, timeline, cost, remediation = check
+        
+        # Filter by doc_ids if specified
+        if doc_ids:
+            chunks = [c for c in chunks if c.get("metadata", {}).get("doc_id") in doc_ids]
         
-        for requirement in area_group["requirements"]:
-            # Search for evidence
-            query = f"{requirement} for {device_name}"
+        # Determine if gap exists
+        has_evidence = len(chunks) > 0 and chunks[0].get("distance", 1) < 0.5
+        
+        if not has_evidence:
+            # Generate citations from any partial evidence
+            fda_citations = []  # Would come from FDA guidance docs if indexed
+            user_citations = extract_citations(chunks[:2]) if chunks else []
             
-            # Build filter
-            chunks = query_chunks(
-                query=query,
-                device_name=device_name if device_name else None,
-                top_k=3
+            gap = GapItem(
+                gap_title=f"Missing: {requirement}",
+                missing_requirement=f"{area_name}: {requirement}",
+                severity=severity,
+                fda_requirement_citations=fda_citations,
+                user_evidence_citations=user_citations,
+                remediation_steps=remediation,
+                estimated_timeline=timeline,
+                estimated_cost=cost
             )
             
-            # Filter by doc_ids if specified
-            if doc_ids:
-                chunks = [c for c in chunks if c.get("metadata", {}).get("doc_id") in doc_ids]
-            
-            # Determine if gap exists
-            has_evidence = len(chunks) > 0 and chunks[0].get("distance", 1) < 0.5
-            
-            if not has_evidence:
-                severity = determine_severity(requirement)
-                
-                # Generate citations from any partial evidence
-                fda_citations = []  # Would come from FDA guidance docs if indexed
-                user_citations = extract_citations(chunks[:2]) if chunks else []
-                
-                gap = GapItem(
-                    gap_title=f"Missing: {requirement}",
-                    missing_requirement=f"{area_name}: {requirement}",
-                    severity=severity,
-                    fda_requirement_citations=fda_citations,
-                    user_evidence_citations=user_citations,
-                    remediation_steps=generate_remediation_steps(requirement, severity),
-                    estimated_timeline=TIMELINE_ESTIMATES[severity],
-                    estimated_cost=COST_ESTIMATES[severity]
-                )
-                
-                gaps.append(gap)
+            gaps.append(gap)
     
-    # Sort by severity
-    severity_order = {"critical": 0, "high": 1, "medium": 2, "low": 3}
-    gaps.sort(key=lambda g: severity_order.get(g.severity, 2))
+    # Order by severity with one pass over the four buckets (stable, like sort)
+    buckets = {"critical": [], "high": [], "medium": [], "low": []}
+    for gap in gaps:
+        buckets.get(gap.severity, buckets["medium"]).append(gap)
     
-    return gaps
+    return buckets["critical"] + buckets["high"] + buckets["medium"] + buckets["low"]
@@ -3,27 +3,111 @@ TraceBridge AI - LLM Service
 OpenAI integration with grounded answering and hallucination mitigation.
 """
 
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional, Tuple
-from openai import OpenAI
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Set, Tuple
+import orjson
+from openai import BadRequestError, OpenAI
 
 from app.config import settings
 from app.models import Citation, VerificationResult
 
 logger = logging.getLogger(__name__)
 
-# Global OpenAI client (lazy loaded)
-_openai_client = None
-
 
+@lru_cache(maxsize=1)
 def _get_openai_client() -> OpenAI:
     """Get or create OpenAI client."""
-    global _openai_client
-    if _openai_client is None:
-        if not settings.openai_api_key:
-            raise ValueError("OPENAI_API_KEY is not configured")
-        _openai_client = OpenAI(api_key=settings.openai_api_key)
-    return _openai_client
+    if not settings.openai_api_key:
+        raise ValueError("OPENAI_API_KEY is not configured")
+    return OpenAI(api_key=settings.openai_api_key)
+
+
+class ResponseCache:
+    """
+    In-memory LRU of chat completions keyed by the exact request.
+    
+    Re-running a query or gap report over unchanged sources sends a
+    byte-identical prompt, so the completion can be reused instead of
+    paying for another round trip. Only exact matches hit: near-duplicate
+    prompts over different sources must not share an answer.
+    """
+    
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(request: Dict[str, Any]) -> bytes:
+        # Every request parameter is part of the key: the same prompt with a
+        # different response_format, temperature or max_tokens is another request
+        return hashlib.sha256(orjson.dumps(request, option=orjson.OPT_SORT_KEYS)).digest()
+    
+    def get(self, request: Dict[str, Any]) -> Optional[str]:
+        """Return the cached completion for this request, if fresh."""
+        key = self._key(request)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            content, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return content
+    
+    def put(self, request: Dict[str, Any], content: str):
+        """Cache a completion, evicting the least recently used."""
+        if self.max_entries <= 0:
+            return
+        key = self._key(request)
+        with self._lock:
+            self._entries[key] = (content, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_response_cache = ResponseCache(settings.llm_cache_size, settings.llm_cache_ttl)
+
+
+def _chat_completion(
+    model: str,
+    system_prompt: str,
+    user_message: str,
+    temperature: float,
+    max_tokens: int,
+    response_format: Optional[Dict[str, Any]] = None
+) -> str:
+    """Run a chat completion, reusing the cached response for identical requests."""
+    request = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message}
+        ],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        **({"response_format": response_format} if response_format else {})
+    }
+    cached = _response_cache.get(request)
+    if cached is not None:
+        logger.info("Using cached LLM response")
+        return cached
+    
+    response = _get_openai_client().chat.completions.create(**request)
+    
+    content = response.choices[0].message.content.strip()
+    _response_cache.put(request, content)
+    return content
 
 
 # System prompts
@@ -57,6 +141,47 @@ Analyze the answer and sources, then respond with a JSON object:
 Be strict. If you find any claim not directly supported by sources, mark source_grounded as false.
 """
 
+# Structured output schema for the verification response
+VERIFICATION_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "verification_result",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "source_grounded": {"type": "boolean"},
+                "evidence_confirmed": {"type": "boolean"},
+                "needs_human_review": {"type": "boolean"},
+                "confidence_score": {"type": "number"},
+                "issues": {"type": "array", "items": {"type": "string"}}
+            },
+            "required": [
+                "source_grounded",
+                "evidence_confirmed",
+                "needs_human_review",
+                "confidence_score",
+                "issues"
+            ],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Models that rejected json_schema; they get plain JSON mode instead
+_json_schema_unsupported: Set[str] = set()
+
+# Phrases that mean the model declined to answer from the sources
+FALLBACK_PHRASES = (
+    "not enough evidence",
+    "cannot find",
+    "no information",
+    "sources do not contain",
+    "unable to find",
+    "not mentioned in"
+)
+FALLBACK_RE = re.compile("|".join(map(re.escape, FALLBACK_PHRASES)), re.IGNORECASE)
+
 
 def format_sources_for_prompt(chunks: List[Dict[str, Any]]) -> str:
     """Format retrieved chunks as sources for the LLM prompt."""
@@ -80,7 +205,8 @@ def format_sources_for_prompt(chunks: List[Dict[str, Any]]) -> str:
 def generate_grounded_answer(
     query: str,
     chunks: List[Dict[str, Any]],
-    model: str = None
+    model: str = None,
+    sources_text: Optional[str] = None
 ) -> Tuple[str, bool]:
     """
     Generate a grounded answer using retrieved chunks.
@@ -89,6 +215,7 @@ def generate_grounded_answer(
         query: User question
         chunks: Retrieved chunks with text and metadata
         model: Optional model override
+        sources_text: format_sources_for_prompt(chunks), if already built
         
     Returns:
         Tuple of (answer, fallback_used)
@@ -107,10 +234,9 @@ def generate_grounded_answer(
         return _generate_fallback_answer(query, chunks)
     
     try:
-        client = _get_openai_client()
-        
         # Format sources
-        sources_text = format_sources_for_prompt(chunks)
+        if sources_text is None:
+            sources_text = format_sources_for_prompt(chunks)
         
         # Build user message
         user_message = f"""Question: {query}
@@ -120,29 +246,16 @@ Sources:
 
 Please answer the question based ONLY on the sources above. Cite sources using [Source X] format."""
 
-        response = client.chat.completions.create(
+        answer = _chat_completion(
             model=model,
-            messages=[
-                {"role": "system", "content": GROUNDED_ANSWER_SYSTEM_PROMPT},
-                {"role": "user", "content": user_message}
-            ],
+            system_prompt=GROUNDED_ANSWER_SYSTEM_PROMPT,
+            user_message=user_message,
             temperature=0.1,  # Low temperature for factual responses
             max_tokens=1000
         )
         
-        answer = response.choices[0].message.content.strip()
-        
         # Check if the model returned a fallback
-        fallback_phrases = [
-            "not enough evidence",
-            "cannot find",
-            "no information",
-            "sources do not contain",
-            "unable to find",
-            "not mentioned in"
-        ]
-        
-        fallback_used = any(phrase in answer.lower() for phrase in fallback_phrases)
+        fallback_used = FALLBACK_RE.search(answer) is not None
         
         return answer, fallback_used
         
@@ -177,10 +290,54 @@ def _generate_fallback_answer(
     return "\n".join(answer_parts), False
 
 
+def _verification_completion(model: str, user_message: str) -> str:
+    """
+    Run the verification prompt with structured outputs where supported.
+    
+    Models without json_schema support reject the request outright; those
+    fall back to JSON mode, which guarantees valid JSON but not the schema.
+    
+    Args:
+        model: Model to use
+        user_message: Answer and sources to verify
+        
+    Returns:
+        The JSON response text
+    """
+    if model not in _json_schema_unsupported:
+        try:
+            return _chat_completion(
+                model=model,
+                system_prompt=EVIDENCE_CHECK_SYSTEM_PROMPT,
+                user_message=user_message,
+                temperature=0,
+                max_tokens=500,
+                response_format=VERIFICATION_RESPONSE_FORMAT
+            )
+        except BadRequestError as e:
+            if "response_format" not in str(e) and "json_schema" not in str(e):
+                raise
+            _json_schema_unsupported.add(model)
+            logger.warning(
+                f"Model {model} does not support json_schema structured outputs; "
+                "falling back to JSON mode for answer verification"
+            )
+    
+    return _chat_completion(
+        model=model,
+        system_prompt=EVIDENCE_CHECK_SYSTEM_PROMPT,
+        user_message=user_message,
+        temperature=0,
+        max_tokens=500,
+        response_format={"type": "json_object"}
+    )
+
+
 def verify_answer(
     answer: str,
     chunks: List[Dict[str, Any]],
-    model: str = None
+    model: str = None,
+    sources_text: Optional[str] = None
 ) -> VerificationResult:
     """
     Verify that an answer is properly grounded in sources.
@@ -189,6 +346,7 @@ def verify_answer(
         answer: The generated answer
         chunks: The source chunks used
         model: Optional model override
+        sources_text: format_sources_for_prompt(chunks), if already built
         
     Returns:
         VerificationResult with grounding status
@@ -212,10 +370,10 @@ def verify_answer(
         )
     
     try:
-        client = _get_openai_client()
         model = model or settings.llm_model
         
-        sources_text = format_sources_for_prompt(chunks)
+        if sources_text is None:
+            sources_text = format_sources_for_prompt(chunks)
         
         user_message = f"""Answer to verify:
 {answer}
@@ -225,42 +383,12 @@ Sources used:
 
 Verify if the answer is properly grounded in the sources."""
 
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": EVIDENCE_CHECK_SYSTEM_PROMPT},
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0,
-            max_tokens=500
-        )
-        
-        result_text = response.choices[0].message.content.strip()
-        
-        # Parse the JSON response
-        import json
-        try:
-            # Try to extract JSON from response
-            if "{" in result_text:
-                json_start = result_text.index("{")
-                json_end = result_text.rindex("}") + 1
-                result_json = json.loads(result_text[json_start:json_end])
-                
-                return VerificationResult(
-                    source_grounded=result_json.get("source_grounded", True),
-                    evidence_confirmed=result_json.get("evidence_confirmed", True),
-                    needs_human_review=result_json.get("needs_human_review", False),
-                    confidence_score=result_json.get("confidence_score", 0.8)
-                )
-        except (json.JSONDecodeError, ValueError):
-            pass
-        
-        # Default if parsing fails
+        result_json = orjson.loads(_verification_completion(model, user_message))
         return VerificationResult(
-            source_grounded=True,
-            evidence_confirmed=True,
-            needs_human_review=True,
-            confidence_score=0.7
+            source_grounded=result_json.get("source_grounded", True),
+            evidence_confirmed=result_json.get("evidence_confirmed", True),
+            needs_human_review=result_json.get("needs_human_review", False),
+            confidence_score=result_json.get("confidence_score", 0.8)
         )
         
     except Exception as e:
@@ -4,11 +4,15 @@ Auto-detects standards, requirement IDs, test IDs, and risk IDs from text.
 """
 
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional, Set
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Characters of a chunk scanned for standards and IDs; the rest is only
+# scanned when the head references nothing
+METADATA_SCAN_BUDGET = 8192
+
 
 # Standard patterns to detect in text
 STANDARD_PATTERNS = {
@@ -47,6 +51,54 @@ ID_PATTERNS = {
     ],
 }
 
+# Compiled once at import. Each ID category is one alternation so a chunk
+# is scanned once per category rather than once per pattern.
+_STANDARD_RES = {
+    name: re.compile(pattern, re.IGNORECASE)
+    for name, pattern in STANDARD_PATTERNS.items()
+}
+_ID_RES = {
+    category: re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+    for category, patterns in ID_PATTERNS.items()
+}
+
+# Every standard and ID pattern fused into one alternation so
+# extract_all_metadata classifies all hits in a single pass. Each
+# alternative is a named group mapped to (category, standard name or None).
+_METADATA_GROUPS = {}
+_metadata_alternatives = []
+for _i, (_name, _pattern) in enumerate(STANDARD_PATTERNS.items()):
+    _METADATA_GROUPS[f"std_{_i}"] = ("standard", _name)
+    _metadata_alternatives.append((f"std_{_i}", _pattern))
+for _category, _patterns in ID_PATTERNS.items():
+    for _i, _pattern in enumerate(_patterns):
+        _METADATA_GROUPS[f"{_category}_{_i}"] = (_category, None)
+        _metadata_alternatives.append((f"{_category}_{_i}", _pattern))
+_METADATA_RE = re.compile(
+    "|".join(f"(?P<{group}>{pattern})" for group, pattern in _metadata_alternatives),
+    re.IGNORECASE
+)
+
+# Every ID and most standards require a digit, so text without one (most
+# narrative prose) only needs the few digit-free patterns
+_HAS_DIGIT = re.compile(r"\d")
+_DIGITLESS_METADATA_RE = re.compile(
+    "|".join(
+        f"(?P<{group}>{pattern})"
+        for group, pattern in _metadata_alternatives
+        if not re.search(r"\\d|[0-9]", pattern)
+    ),
+    re.IGNORECASE
+)
+del _metadata_alternatives
+
+# Patterns for a first line that looks like a section heading
+_HEADING_RES = (
+    re.compile(r"^\d+(?:\.\d+)*\s+[A-Z]"),  # "1.2.3 Introduction"
+    re.compile(r"^[A-Z][A-Z\s]+$"),  # "INTRODUCTION"
+    re.compile(r"^(?:Section|Chapter|Part)\s+\d+"),  # "Section 1"
+)
+
 
 def detect_standards(text: str) -> List[str]:
     """
@@ -62,10 +114,9 @@ def detect_standards(text: str) -> List[str]:
         return []
     
     detected = set()
-    text_upper = text.upper()
     
-    for standard_name, pattern in STANDARD_PATTERNS.items():
-        if re.search(pattern, text, re.IGNORECASE):
+    for standard_name, pattern in _STANDARD_RES.items():
+        if pattern.search(text):
             detected.add(standard_name)
     
     return sorted(list(detected))
@@ -81,14 +132,10 @@ def detect_requirement_ids(text: str) -> List[str]:
     Returns:
         List of detected requirement IDs
     """
-    if not text:
+    if not text or not _HAS_DIGIT.search(text):
         return []
     
-    detected = set()
-    
-    for pattern in ID_PATTERNS["requirement"]:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        detected.update(match.upper() for match in matches)
+    detected = {match.upper() for match in _ID_RES["requirement"].findall(text)}
     
     return sorted(list(detected))[:10]  # Limit to 10 IDs per chunk
 
@@ -103,14 +150,10 @@ def detect_test_case_ids(text: str) -> List[str]:
     Returns:
         List of detected test case IDs
     """
-    if not text:
+    if not text or not _HAS_DIGIT.search(text):
         return []
     
-    detected = set()
-    
-    for pattern in ID_PATTERNS["test_case"]:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        detected.update(match.upper() for match in matches)
+    detected = {match.upper() for match in _ID_RES["test_case"].findall(text)}
     
     return sorted(list(detected))[:10]
 
@@ -125,14 +168,10 @@ def detect_risk_ids(text: str) -> List[str]:
     Returns:
         List of detected risk IDs
     """
-    if not text:
+    if not text or not _HAS_DIGIT.search(text):
         return []
     
-    detected = set()
-    
-    for pattern in ID_PATTERNS["risk"]:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        detected.update(match.upper() for match in matches)
+    detected = {match.upper() for match in _ID_RES["risk"].findall(text)}
     
     return sorted(list(detected))[:10]
 
@@ -157,19 +196,34 @@ def detect_section_heading(text: str) -> Optional[str]:
     # Check if it looks like a heading (short, possibly numbered)
     if len(first_line) < 100:
         # Check for numbered heading patterns
-        heading_patterns = [
-            r"^\d+(?:\.\d+)*\s+[A-Z]",  # "1.2.3 Introduction"
-            r"^[A-Z][A-Z\s]+$",  # "INTRODUCTION"
-            r"^(?:Section|Chapter|Part)\s+\d+",  # "Section 1"
-        ]
-        
-        for pattern in heading_patterns:
-            if re.match(pattern, first_line):
+        for pattern in _HEADING_RES:
+            if pattern.match(first_line):
                 return first_line[:80]
     
     return None
 
 
+def _scan_metadata(
+    text: str,
+    pos: int,
+    endpos: int,
+    standards: Set[str],
+    ids: Dict[str, Set[str]]
+):
+    """Add every standard and ID found in text[pos:endpos] to the given sets."""
+    if _HAS_DIGIT.search(text, pos, endpos):
+        pattern = _METADATA_RE
+    else:
+        pattern = _DIGITLESS_METADATA_RE
+    
+    for match in pattern.finditer(text, pos, endpos):
+        category, standard_name = _METADATA_GROUPS[match.lastgroup]
+        if standard_name is not None:
+            standards.add(standard_name)
+        else:
+            ids[category].add(match.group().upper())
+
+
 def extract_all_metadata(text: str) -> Dict[str, Any]:
     """
     Extract all detectable metadata from text.
@@ -180,30 +234,42 @@ def extract_all_metadata(text: str) -> Dict[str, Any]:
     Returns:
         Dictionary with all detected metadata
     """
+    standards = set()
+    ids = {category: set() for category in ID_PATTERNS}
+    
+    if text:
+        # Scan only the head of very long text unless it references nothing
+        cut = len(text)
+        if cut > METADATA_SCAN_BUDGET:
+            # Cut at whitespace so no ID is truncated at the budget edge
+            cut = max(
+                text.rfind(" ", 0, METADATA_SCAN_BUDGET),
+                text.rfind("\n", 0, METADATA_SCAN_BUDGET)
+            )
+            if cut <= 0:
+                cut = METADATA_SCAN_BUDGET
+        
+        _scan_metadata(text, 0, cut, standards, ids)
+        if cut < len(text) and not standards and not any(ids.values()):
+            _scan_metadata(text, cut, len(text), standards, ids)
+    
     return {
-        "standards_referenced": detect_standards(text),
-        "requirement_ids": detect_requirement_ids(text),
-        "test_case_ids": detect_test_case_ids(text),
-        "risk_ids": detect_risk_ids(text),
+        "standards_referenced": sorted(standards),
+        "requirement_ids": sorted(ids["requirement"])[:10],
+        "test_case_ids": sorted(ids["test_case"])[:10],
+        "risk_ids": sorted(ids["risk"])[:10],
         "section_heading": detect_section_heading(text),
     }
 
 
-def aggregate_standards_from_chunks(chunks_metadata: List[Dict[str, Any]]) -> List[str]:
+def aggregate_standards_from_chunks(chunk_standards: Iterable[Iterable[str]]) -> List[str]:
     """
     Aggregate all unique standards from multiple chunks.
     
     Args:
-        chunks_metadata: List of chunk metadata dictionaries
+        chunk_standards: Standards referenced by each chunk
         
     Returns:
-        Unique list of all standards found
+        Sorted unique list of all standards found
     """
-    all_standards = set()
-    
-    for metadata in chunks_metadata:
-        standards = metadata.get("standards_referenced", [])
-        if isinstance(standards, list):
-            all_standards.update(standards)
-    
-    return sorted(list(all_standards))
+    return sorted(set().union(*chunk_standards))
@@ -5,12 +5,56 @@ Handles PDF and DOCX text extraction with page-level metadata.
 
 import fitz  # PyMuPDF
 from docx import Document
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
+import asyncio
+import hashlib
 import logging
+import multiprocessing
+import os
+
+import orjson
+
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Worker processes for CPU-bound parsing, created on first use
+_parser_pool: Optional[ProcessPoolExecutor] = None
+
+# Minimum pages handed to each worker when a PDF is split across the pool
+PDF_PAGES_PER_WORKER = 25
+
+
+def get_parser_pool() -> ProcessPoolExecutor:
+    """
+    Get or create the process pool for CPU-bound parsing.
+    
+    By the time the pool is first used the process is running the vector
+    store saver thread and holds sqlite connections, memmaps and the
+    embedding model, so workers come from a clean forkserver (spawn where
+    that is unavailable) rather than fork(). Creating the pool lazily also
+    keeps worker processes, which import this module, from building pools
+    of their own.
+    """
+    global _parser_pool
+    if _parser_pool is None:
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _parser_pool = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context(method)
+        )
+    return _parser_pool
+
+
+def close_parser_pool():
+    """Shut down the parser process pool without waiting on pending work."""
+    global _parser_pool
+    if _parser_pool is not None:
+        _parser_pool.shutdown(wait=False, cancel_futures=True)
+        _parser_pool = None
+
 
 class ParsedPage:
     """Represents a parsed page with text and metadata."""
@@ -27,20 +71,88 @@ class ParsedPage:
 
 
 class ParsedDocument:
-    """Represents a fully parsed document."""
+    """
+    Represents a fully parsed document.
+    
+    Pages are stored as parallel lists of texts and page numbers rather
+    than one object per page; `pages` builds ParsedPage views on demand.
+    """
     
-    def __init__(self, filename: str, pages: List[ParsedPage]):
+    def __init__(self, filename: str, texts: List[str], page_numbers: List[Optional[int]]):
         self.filename = filename
-        self.pages = pages
+        self.texts = texts
+        self.page_numbers = page_numbers
+    
+    @property
+    def pages(self) -> List[ParsedPage]:
+        return [ParsedPage(text, number) for text, number in zip(self.texts, self.page_numbers)]
     
     @property
     def full_text(self) -> str:
         """Get concatenated text from all pages."""
-        return "\n\n".join(page.text for page in self.pages if page.text.strip())
+        return "\n\n".join(text for text in self.texts if text.strip())
     
     @property
     def page_count(self) -> int:
-        return len(self.pages)
+        return len(self.texts)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "filename": self.filename,
+            "texts": self.texts,
+            "page_numbers": self.page_numbers
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ParsedDocument":
+        return cls(
+            filename=data["filename"],
+            texts=data["texts"],
+            page_numbers=data["page_numbers"]
+        )
+
+
+def _extract_pdf_pages(
+    file_path: str,
+    start: int = 0,
+    stop: Optional[int] = None
+) -> Tuple[List[str], List[int]]:
+    """
+    Extract non-empty page texts for a range of PDF pages.
+    
+    Args:
+        file_path: Path to the PDF file
+        start: First page index (0-based)
+        stop: Page index to stop before (defaults to the last page)
+        
+    Returns:
+        Tuple of (page texts, 1-indexed page numbers)
+    """
+    texts = []
+    page_numbers = []
+    
+    with fitz.open(file_path) as doc:
+        if stop is None:
+            stop = len(doc)
+        
+        for page_num in range(start, stop):
+            page = doc[page_num]
+            text = page.get_text("text")
+            
+            # Clean up the text
+            text = text.strip()
+            
+            if text:  # Only add non-empty pages
+                texts.append(text)
+                page_numbers.append(page_num + 1)  # 1-indexed
+    
+    return texts, page_numbers
+
+
+def _pdf_page_count(file_path: str) -> int:
+    """Number of pages in a PDF file."""
+    with fitz.open(file_path) as doc:
+        return len(doc)
 
 
 def parse_pdf(file_path: str) -> ParsedDocument:
@@ -57,33 +169,58 @@ def parse_pdf(file_path: str) -> ParsedDocument:
     if not path.exists():
         raise FileNotFoundError(f"PDF file not found: {file_path}")
     
-    pages = []
+    try:
+        texts, page_numbers = _extract_pdf_pages(file_path)
+        
+        logger.info(f"Parsed PDF '{path.name}': {len(texts)} pages with content")
+        
+    except Exception as e:
+        logger.error(f"Error parsing PDF '{file_path}': {str(e)}")
+        raise ValueError(f"Failed to parse PDF: {str(e)}")
+    
+    return ParsedDocument(filename=path.name, texts=texts, page_numbers=page_numbers)
+
+
+async def _parse_pdf_parallel(file_path: str) -> ParsedDocument:
+    """
+    Parse a PDF by splitting its pages across the parser process pool.
+    
+    MuPDF is not thread-safe, so pages are extracted by separate worker
+    processes, each opening its own handle on the file.
+    """
+    path = Path(file_path)
+    if not path.exists():
+        raise FileNotFoundError(f"PDF file not found: {file_path}")
+    
+    loop = asyncio.get_running_loop()
     
     try:
-        doc = fitz.open(file_path)
+        # Opening the file can be slow for large or damaged PDFs
+        page_count = await loop.run_in_executor(get_parser_pool(), _pdf_page_count, file_path)
         
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            text = page.get_text("text")
-            
-            # Clean up the text
-            text = text.strip()
-            
-            if text:  # Only add non-empty pages
-                pages.append(ParsedPage(
-                    text=text,
-                    page_number=page_num + 1  # 1-indexed
-                ))
+        workers = max(1, min(os.cpu_count() or 1, page_count // PDF_PAGES_PER_WORKER))
+        step = -(-page_count // workers)  # ceil division
         
-        doc.close()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(
+                get_parser_pool(), _extract_pdf_pages, file_path, start, min(start + step, page_count)
+            )
+            for start in range(0, page_count, step)
+        )) if page_count else []
         
-        logger.info(f"Parsed PDF '{path.name}': {len(pages)} pages with content")
+        texts = [text for result in results for text in result[0]]
+        page_numbers = [number for result in results for number in result[1]]
+        
+        logger.info(
+            f"Parsed PDF '{path.name}': {len(texts)} pages with content "
+            f"({len(results)} workers)"
+        )
         
     except Exception as e:
         logger.error(f"Error parsing PDF '{file_path}': {str(e)}")
         raise ValueError(f"Failed to parse PDF: {str(e)}")
     
-    return ParsedDocument(filename=path.name, pages=pages)
+    return ParsedDocument(filename=path.name, texts=texts, page_numbers=page_numbers)
 
 
 def parse_docx(file_path: str) -> ParsedDocument:
@@ -101,7 +238,8 @@ def parse_docx(file_path: str) -> ParsedDocument:
     if not path.exists():
         raise FileNotFoundError(f"DOCX file not found: {file_path}")
     
-    pages = []
+    texts = []
+    page_numbers = []
     
     try:
         doc = Document(file_path)
@@ -128,10 +266,8 @@ def parse_docx(file_path: str) -> ParsedDocument:
         
         if full_text.strip():
             # DOCX doesn't have page numbers, so we use None
-            pages.append(ParsedPage(
-                text=full_text,
-                page_number=None
-            ))
+            texts.append(full_text)
+            page_numbers.append(None)
         
         logger.info(f"Parsed DOCX '{path.name}': {len(paragraphs)} paragraphs")
         
@@ -139,10 +275,91 @@ def parse_docx(file_path: str) -> ParsedDocument:
         logger.error(f"Error parsing DOCX '{file_path}': {str(e)}")
         raise ValueError(f"Failed to parse DOCX: {str(e)}")
     
-    return ParsedDocument(filename=path.name, pages=pages)
+    return ParsedDocument(filename=path.name, texts=texts, page_numbers=page_numbers)
+
+
+def file_digest(file_path: str) -> str:
+    """SHA-256 of a file's contents, read in 1 MiB chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_cached(digest: str, filename: str) -> Optional[ParsedDocument]:
+    """Load a previously parsed document by content hash, if cached."""
+    cache_file = os.path.join(settings.parse_cache_dir, f"{digest}.json")
+    try:
+        with open(cache_file, "rb") as f:
+            data = orjson.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable parse cache entry {cache_file}: {e}")
+        return None
+    
+    # Mark as recently used for LRU eviction; the entry may already have
+    # been evicted by another upload, but its contents are loaded
+    try:
+        os.utime(cache_file)
+    except OSError:
+        pass
+    
+    # The same bytes may have been uploaded under another name
+    data["filename"] = filename
+    logger.info(f"Parse cache hit for '{filename}'")
+    return ParsedDocument.from_dict(data)
+
+
+def _store_cached(digest: str, doc: ParsedDocument):
+    """Cache a parsed document and evict the least recently used entries."""
+    os.makedirs(settings.parse_cache_dir, exist_ok=True)
+    cache_file = os.path.join(settings.parse_cache_dir, f"{digest}.json")
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, "wb") as f:
+            f.write(orjson.dumps(doc.to_dict()))
+        os.replace(tmp_file, cache_file)
+        
+        entries = [
+            entry for entry in os.scandir(settings.parse_cache_dir)
+            if entry.name.endswith(".json")
+        ]
+        excess = len(entries) - settings.parse_cache_max_entries
+        if excess > 0:
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:excess]:
+                os.remove(entry.path)
+    except OSError as e:
+        logger.warning(f"Could not write parse cache entry {cache_file}: {e}")
 
 
 def parse_document(file_path: str) -> ParsedDocument:
+    """
+    Parse a document, reusing the cached result for identical file contents.
+    
+    Args:
+        file_path: Path to the document file
+        
+    Returns:
+        ParsedDocument with extracted content
+        
+    Raises:
+        ValueError: If file type is not supported
+    """
+    if not settings.parse_cache_enabled:
+        return _parse_file(file_path)
+    
+    digest = file_digest(file_path)
+    doc = _load_cached(digest, Path(file_path).name)
+    if doc is None:
+        doc = _parse_file(file_path)
+        _store_cached(digest, doc)
+    return doc
+
+
+def _parse_file(file_path: str) -> ParsedDocument:
     """
     Parse a document based on its file extension.
     
@@ -166,3 +383,37 @@ def parse_document(file_path: str) -> ParsedDocument:
         return parse_docx(file_path)
     else:
         raise ValueError(f"Unsupported file type: {extension}. Supported types: .pdf, .docx")
+
+
+def _parse_document_to_dict(file_path: str) -> Dict[str, Any]:
+    """Parse in a worker process, returning a plain dict for transport."""
+    return _parse_file(file_path).to_dict()
+
+
+async def parse_document_async(file_path: str) -> ParsedDocument:
+    """
+    Parse a document in the parser process pool without blocking the event loop.
+    
+    Args:
+        file_path: Path to the document file
+        
+    Returns:
+        ParsedDocument with extracted content
+    """
+    digest = None
+    if settings.parse_cache_enabled:
+        digest = await asyncio.to_thread(file_digest, file_path)
+        cached = await asyncio.to_thread(_load_cached, digest, Path(file_path).name)
+        if cached is not None:
+            return cached
+    
+    if Path(file_path).suffix.lower() == ".pdf":
+        doc = await _parse_pdf_parallel(file_path)
+    else:
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(get_parser_pool(), _parse_document_to_dict, file_path)
+        doc = ParsedDocument.from_dict(data)
+    
+    if digest is not None:
+        await asyncio.to_thread(_store_cached, digest, doc)
+    return doc
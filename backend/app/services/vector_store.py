@@ -4,98 +4,507 @@ Enhanced with extended metadata support for filtering.
 """
 
 import numpy as np
-from typing import List, Dict, Any, Optional
+import orjson
+from collections import Counter, OrderedDict, defaultdict
+from typing import Callable, Iterable, List, Dict, Any, Optional, Set, Tuple
 from datetime import datetime
+import asyncio
 import logging
 import os
 import pickle
+import sqlite3
+import threading
+import time
 
 from app.config import settings
-from app.models import Chunk, DocumentMetadata, DocType
-from app.services.embeddings import get_embeddings, get_embedding
+from app.models import DocumentMetadata, DocType
+from app.services.chunker import ChunkRecord
+from app.services.embeddings import (
+    get_embeddings, get_embeddings_async, get_embedding_model_id,
+    get_query_embeddings
+)
+from app.services.embedding_cache import EmbeddingCache
 
 logger = logging.getLogger(__name__)
 
+# Filters matching fewer than 1/N of the rows score only their candidates
+SELECTIVE_FILTER_RATIO = 4
+
+# Rows upcast to float32 at a time when scoring a reduced-precision matrix
+SCORE_BLOCK_ROWS = 4096
+
+# Largest score matrix (in float32 entries) kept around for reuse by query()
+SCORE_BUFFER_MAX = 4 * 1024 * 1024
+
+# Seconds between background flushes of pending writes
+SAVE_INTERVAL = 0.25
+
+# Fraction of tombstoned rows at which the background saver compacts
+COMPACT_TOMBSTONE_RATIO = 0.2
+
+# Vector file name for each supported storage dtype
+VECTOR_FILES = {"float32": "vectors.f32", "float16": "vectors.f16", "int8": "vectors.i8"}
+
+# Per-row dequantization scales for int8 storage
+SCALE_FILE = "scales.f32"
+
+# Sentinel for metadata keys absent from a chunk
+_MISSING = object()
+
+# Metadata fields with an inverted index for equality filters; list-valued
+# fields (standards_referenced) index each element, matching _compile_filter
+INDEXED_FIELDS = ("doc_id", "filename", "device_name", "doc_type", "standards_referenced")
+
 
 class SimpleVectorStore:
-    """Enhanced in-memory vector store with metadata filtering."""
+    """Enhanced in-memory vector store with metadata filtering.
+    
+    Embeddings are kept in a single contiguous matrix of L2-normalized
+    rows, so cosine similarity against every stored chunk is one
+    matrix-vector product. Rows are stored as float32, as float16 to
+    halve memory and bandwidth, or as int8 with a per-row scale to
+    quarter it (settings.embedding_dtype).
+    
+    Persistence is incremental: the matrix is a memory-mapped file that
+    only ever has new rows written to it, and chunk text and metadata
+    live in sqlite. Deleted rows are zeroed and left as tombstones; the
+    background saver runs `compact()` once they make up
+    COMPACT_TOMBSTONE_RATIO of the matrix.
+    
+    Writes are flushed to disk by a background thread: mutations only mark
+    the store dirty, and a burst of them shares one flush and commit. Call
+    `close()` on shutdown to flush any pending writes. The in-memory state
+    is per process, so multi-worker deployments need a shared store.
+    """
     
     def __init__(self, persist_path: str):
         self.persist_path = persist_path
-        self.documents: Dict[str, str] = {}  # id -> text
-        self.embeddings: Dict[str, List[float]] = {}  # id -> embedding
-        self.metadatas: Dict[str, Dict[str, Any]] = {}  # id -> metadata
+        # id -> (text, row, metadata); the vector lives in self._matrix[row]
+        self._rows: Dict[str, Tuple[str, int, Dict[str, Any]]] = {}
+        self._ids: List[Optional[str]] = []  # row -> id (None for deleted rows)
+        self._dim: Optional[int] = None
+        self._dtype = np.dtype(settings.embedding_dtype)
+        self._matrix: Optional[np.memmap] = None  # (capacity, dim)
+        self._scales: Optional[np.memmap] = None  # (capacity,), int8 storage only
+        self._live = np.zeros(0, dtype=bool)  # row -> not deleted
+        # field -> value -> ids, for equality filters on INDEXED_FIELDS
+        self._by_field: Dict[str, Dict[Any, Set[str]]] = defaultdict(lambda: defaultdict(set))
+        # doc_id -> document-level info, maintained on add/delete
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        # Scratch space for query scores, reused under the lock
+        self._score_buffer = np.empty(0, dtype=np.float32)
+        self._lock = threading.RLock()
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        
+        os.makedirs(self.persist_path, exist_ok=True)
+        self._db = sqlite3.connect(
+            os.path.join(self.persist_path, "vector_store.sqlite"),
+            check_same_thread=False
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks("
+            "id TEXT PRIMARY KEY, text TEXT, row INTEGER, metadata TEXT)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta(name TEXT PRIMARY KEY, value INTEGER)")
+        self._db.commit()
+        
         self._load()
+        self._migrate_pickle()
+        
+        self._saver = threading.Thread(
+            target=self._save_loop, name="vector-store-saver", daemon=True
+        )
+        self._saver.start()
+    
+    @staticmethod
+    def _normalize(vectors: Any) -> np.ndarray:
+        """Convert embeddings to a float32 matrix with L2-normalized rows."""
+        v = np.array(vectors, dtype=np.float32, ndmin=2)
+        norms = np.linalg.norm(v, axis=1, keepdims=True)
+        norms[norms == 0] = 1  # leave all-zero vectors as they are
+        v /= norms
+        return v
+    
+    @property
+    def _size(self) -> int:
+        """Number of matrix rows in use, including tombstones."""
+        return len(self._ids)
+    
+    @property
+    def _tombstones(self) -> int:
+        """Number of deleted rows still occupying the matrix."""
+        return len(self._ids) - len(self._rows)
+    
+    def _reserve(self, rows: int):
+        """Grow the vector file geometrically to hold at least `rows` rows."""
+        capacity = self._matrix.shape[0] if self._matrix is not None else 0
+        if rows <= capacity:
+            return
+        
+        new_capacity = max(2 * capacity, rows, 1024)
+        self._unmap()
+        with open(self._vec_path, "ab") as f:
+            f.truncate(new_capacity * self._dim * self._dtype.itemsize)
+        if self._quantized:
+            with open(self._scale_path, "ab") as f:
+                f.truncate(new_capacity * 4)
+        self._map(new_capacity)
+    
+    def _map(self, capacity: int):
+        """(Re)open the vector file as a memmap of the given row capacity."""
+        self._matrix = np.memmap(
+            self._vec_path, dtype=self._dtype, mode="r+",
+            shape=(capacity, self._dim)
+        )
+        if self._quantized:
+            self._scales = np.memmap(
+                self._scale_path, dtype=np.float32, mode="r+", shape=(capacity,)
+            )
+        live = np.zeros(capacity, dtype=bool)
+        n = min(capacity, len(self._live))
+        live[:n] = self._live[:n]
+        self._live = live
+    
+    def _unmap(self):
+        """Flush and close the memory-mapped files."""
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        if self._scales is not None:
+            self._scales.flush()
+            self._scales = None
+    
+    @property
+    def _quantized(self) -> bool:
+        return self._dtype == np.int8
+    
+    def _write_rows(self, rows: Any, vectors: np.ndarray):
+        """Store normalized vectors in the given rows (index list or slice), quantizing if needed."""
+        if not self._quantized:
+            self._matrix[rows] = vectors
+            return
+        
+        # Symmetric per-row quantization: v ~= q * scale, q in [-127, 127]
+        scales = np.abs(vectors).max(axis=1) / 127
+        safe = np.where(scales == 0, 1, scales)
+        self._matrix[rows] = np.rint(vectors / safe[:, None]).astype(np.int8)
+        self._scales[rows] = scales
+    
+    @staticmethod
+    def _field_values(value: Any) -> Iterable[Any]:
+        """Index keys for a metadata value: each element of a list, else the value."""
+        return value if isinstance(value, list) else (value,)
+    
+    def _index(self, id: str, metadata: Dict[str, Any]):
+        """Add an id to the inverted indexes and document table."""
+        for field in INDEXED_FIELDS:
+            if field in metadata:
+                for value in self._field_values(metadata[field]):
+                    self._by_field[field][value].add(id)
+        
+        doc_id = metadata.get("doc_id")
+        if doc_id:
+            info = self._documents.get(doc_id)
+            if info is None:
+                info = self._documents[doc_id] = {
+                    "filename": metadata.get("filename", "unknown"),
+                    "uploaded_at": metadata.get("uploaded_at", ""),
+                    "device_name": metadata.get("device_name", ""),
+                    "doc_type": metadata.get("doc_type", "other"),
+                    "chunk_count": 0,
+                    "standards": Counter()
+                }
+            info["chunk_count"] += 1
+            standards = metadata.get("standards_referenced", [])
+            if isinstance(standards, list):
+                info["standards"].update(standards)
+    
+    def _unindex(self, id: str, metadata: Dict[str, Any]):
+        """Remove an id from the inverted indexes and document table."""
+        for field in INDEXED_FIELDS:
+            if field not in metadata:
+                continue
+            for value in self._field_values(metadata[field]):
+                ids = self._by_field[field].get(value)
+                if ids is not None:
+                    ids.discard(id)
+                    if not ids:
+                        del self._by_field[field][value]
+        
+        info = self._documents.get(metadata.get("doc_id"))
+        if info is not None:
+            info["chunk_count"] -= 1
+            if info["chunk_count"] <= 0:
+                del self._documents[metadata["doc_id"]]
+                return
+            standards = metadata.get("standards_referenced", [])
+            if isinstance(standards, list):
+                info["standards"].subtract(standards)
+                info["standards"] += Counter()  # drop non-positive counts
+    
+    def document_chunk_count(self, doc_id: str) -> int:
+        """Number of chunks stored for a document."""
+        info = self._documents.get(doc_id)
+        return info["chunk_count"] if info else 0
+    
+    def list_document_info(self) -> Dict[str, Dict[str, Any]]:
+        """Document-level info keyed by doc_id, with aggregated standards."""
+        with self._lock:
+            return {
+                doc_id: {**info, "standards": sorted(info["standards"])}
+                for doc_id, info in self._documents.items()
+            }
+    
+    @property
+    def _vec_path(self) -> str:
+        return os.path.join(self.persist_path, VECTOR_FILES[self._dtype.name])
+    
+    @property
+    def _scale_path(self) -> str:
+        return os.path.join(self.persist_path, SCALE_FILE)
+    
+    def _save(self):
+        """Flush the vector file and commit pending sqlite writes."""
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            if self._scales is not None:
+                self._scales.flush()
+            self._db.commit()
+    
+    def _save_loop(self):
+        """Background saver: flush coalesced writes every SAVE_INTERVAL seconds."""
+        while not self._stop.is_set():
+            if self._dirty.wait(SAVE_INTERVAL):
+                self._dirty.clear()
+                try:
+                    if self._tombstones > self._size * COMPACT_TOMBSTONE_RATIO:
+                        self.compact()
+                    self._save()
+                except Exception as e:
+                    logger.error(f"Error saving vector store: {e}")
+    
+    def close(self):
+        """Stop the background saver and flush pending writes."""
+        self._stop.set()
+        self._dirty.set()
+        self._saver.join()
+        self._save()
+    
+    def _set_meta(self, name: str, value: Any):
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (name, value))
     
     def _load(self):
         """Load persisted data if exists."""
-        data_file = os.path.join(self.persist_path, "vector_store.pkl")
-        if os.path.exists(data_file):
-            try:
-                with open(data_file, "rb") as f:
-                    data = pickle.load(f)
-                    self.documents = data.get("documents", {})
-                    self.embeddings = data.get("embeddings", {})
-                    self.metadatas = data.get("metadatas", {})
-                logger.info(f"Loaded {len(self.documents)} chunks from persistence")
-            except Exception as e:
-                logger.warning(f"Could not load persisted data: {e}")
+        try:
+            meta = dict(self._db.execute("SELECT name, value FROM meta").fetchall())
+            self._dim = meta.get("dim")
+            size = meta.get("size", 0)
+            
+            # An existing store keeps the dtype it was created with
+            dtype = np.dtype(meta.get("dtype", "float32"))
+            if self._dim and dtype != self._dtype:
+                logger.warning(
+                    f"Vector store was created with {dtype.name} embeddings; "
+                    f"ignoring embedding_dtype={self._dtype.name}"
+                )
+                self._dtype = dtype
+            
+            # Roll a compaction forward if it crashed after committing the
+            # row remap; otherwise its temporary files are incomplete
+            if meta.get("compact_pending"):
+                self._finish_compact()
+            else:
+                for path in (self._vec_path, self._scale_path):
+                    if os.path.exists(path + ".tmp"):
+                        os.remove(path + ".tmp")
+            
+            if not self._dim or not os.path.exists(self._vec_path):
+                return
+            
+            self._map(os.path.getsize(self._vec_path) // (self._dim * self._dtype.itemsize))
+            self._ids = [None] * size
+            for id, text, row, metadata in self._db.execute(
+                "SELECT id, text, row, metadata FROM chunks ORDER BY row"
+            ):
+                metadata = orjson.loads(metadata)
+                self._rows[id] = (text, row, metadata)
+                self._ids[row] = id
+                self._live[row] = True
+                self._index(id, metadata)
+            logger.info(f"Loaded {len(self._rows)} chunks from persistence")
+        except Exception as e:
+            logger.warning(f"Could not load persisted data: {e}")
     
-    def _save(self):
-        """Persist data to disk."""
-        os.makedirs(self.persist_path, exist_ok=True)
+    def _migrate_pickle(self):
+        """One-shot import of a store persisted by the old pickle format."""
         data_file = os.path.join(self.persist_path, "vector_store.pkl")
+        if not os.path.exists(data_file) or self._rows:
+            return
+        
         try:
-            with open(data_file, "wb") as f:
-                pickle.dump({
-                    "documents": self.documents,
-                    "embeddings": self.embeddings,
-                    "metadatas": self.metadatas
-                }, f)
+            with open(data_file, "rb") as f:
+                data = pickle.load(f)
+            documents = data.get("documents", {})
+            metadatas = data.get("metadatas", {})
+            if "matrix" in data:
+                ids = data.get("ids", [])
+                embeddings = data["matrix"]
+            else:
+                embeddings_by_id = data.get("embeddings", {})
+                ids = list(embeddings_by_id.keys())
+                embeddings = list(embeddings_by_id.values())
+            
+            if ids:
+                self.add(
+                    ids=ids,
+                    documents=[documents.get(id, "") for id in ids],
+                    embeddings=embeddings,
+                    metadatas=[metadatas.get(id, {}) for id in ids]
+                )
+                self._save()
+            os.replace(data_file, data_file + ".migrated")
+            logger.info(f"Migrated {len(ids)} chunks from {data_file}")
         except Exception as e:
-            logger.error(f"Could not persist data: {e}")
+            logger.warning(f"Could not migrate persisted data: {e}")
     
     def add(self, ids: List[str], documents: List[str], 
             embeddings: List[List[float]], metadatas: List[Dict[str, Any]]):
         """Add documents with embeddings and metadata."""
-        for i, id in enumerate(ids):
-            self.documents[id] = documents[i]
-            self.embeddings[id] = embeddings[i]
-            self.metadatas[id] = metadatas[i]
-        self._save()
-    
-    def _matches_filter(self, metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
-        """Check if metadata matches filter conditions."""
-        for key, value in where.items():
-            if key not in metadata:
-                return False
+        if not ids:
+            return
+        
+        vectors = self._normalize(embeddings)
+        
+        with self._lock:
+            if self._dim is None:
+                self._dim = int(vectors.shape[1])
+                self._set_meta("dim", self._dim)
+                self._set_meta("dtype", self._dtype.name)
+            
+            # Re-adding an existing id replaces its row in place
+            start = len(self._ids)
+            rows = []
+            for i, id in enumerate(ids):
+                existing = self._rows.get(id)
+                if existing is not None:
+                    row = existing[1]
+                    self._unindex(id, existing[2])
+                else:
+                    row = len(self._ids)
+                    self._ids.append(id)
+                self._rows[id] = (documents[i], row, metadatas[i])
+                self._index(id, metadatas[i])
+                rows.append(row)
+            
+            # A batch of only new ids (the usual ingest) fills one contiguous
+            # block, written with slice copies instead of fancy indexing
+            target = rows
+            if self._size - start == len(rows):
+                target = slice(start, self._size)
             
-            meta_value = metadata[key]
+            self._reserve(self._size)
+            self._write_rows(target, vectors)
+            self._live[target] = True
             
-            # Handle list fields (e.g., standards_referenced)
-            if isinstance(meta_value, list):
-                if value not in meta_value:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks(id, text, row, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (id, documents[i], rows[i], orjson.dumps(metadatas[i]))
+                    for i, id in enumerate(ids)
+                ]
+            )
+            self._set_meta("size", self._size)
+        self._dirty.set()
+    
+    @staticmethod
+    def _compile_filter(where: Dict[str, Any]) -> Callable[[Dict[str, Any]], bool]:
+        """Build the metadata predicate for a where clause once per scan."""
+        conditions = tuple(where.items())
+        
+        def matches(metadata: Dict[str, Any]) -> bool:
+            for key, value in conditions:
+                meta_value = metadata.get(key, _MISSING)
+                if meta_value is _MISSING:
+                    return False
+                
+                # Handle list fields (e.g., standards_referenced)
+                if isinstance(meta_value, list):
+                    if value not in meta_value:
+                        return False
+                # Handle exact match
+                elif meta_value != value:
                     return False
-            # Handle exact match
-            elif meta_value != value:
-                return False
+            
+            return True
+        
+        return matches
+    
+    def _score(self, rows: Any, query_embs: np.ndarray) -> np.ndarray:
+        """
+        Cosine similarity of the selected rows (index array or slice) with
+        normalized queries, as a (queries, rows) matrix from one GEMM.
+        """
+        matrix = self._matrix[rows]
+        scores = self._scratch_scores(len(query_embs), len(matrix))
+        if matrix.dtype == np.float32:
+            return np.matmul(query_embs, matrix.T, out=scores)
+        
+        # Upcast reduced-precision rows block by block for float32 accumulation
+        for i in range(0, len(matrix), SCORE_BLOCK_ROWS):
+            block = matrix[i:i + SCORE_BLOCK_ROWS]
+            scores[:, i:i + SCORE_BLOCK_ROWS] = query_embs @ block.astype(np.float32).T
+        if self._quantized:
+            scores *= self._scales[rows]
+        return scores
+    
+    def _scratch_scores(self, n_queries: int, n_rows: int) -> np.ndarray:
+        """
+        A (queries, rows) float32 array for scores, backed by a buffer that
+        is reused across queries instead of reallocated and page-faulted
+        in each time. Only valid until the next call; callers hold the lock.
+        """
+        size = n_queries * n_rows
+        if size > SCORE_BUFFER_MAX:
+            return np.empty((n_queries, n_rows), dtype=np.float32)
+        if size > self._score_buffer.size:
+            self._score_buffer = np.empty(
+                min(max(size, 2 * self._score_buffer.size), SCORE_BUFFER_MAX),
+                dtype=np.float32
+            )
+        return self._score_buffer[:size].reshape(n_queries, n_rows)
+    
+    def _select(self, where: Dict[str, Any]) -> List[str]:
+        """Ids matching a where clause, using the inverted indexes when possible."""
+        indexed = [(key, value) for key, value in where.items() if key in INDEXED_FIELDS]
+        if not indexed:
+            matches = self._compile_filter(where)
+            return [
+                id for id, (_, _, metadata) in self._rows.items()
+                if matches(metadata)
+            ]
         
-        return True
+        candidates = set.intersection(*(
+            self._by_field[key].get(value, set()) for key, value in indexed
+        ))
+        rest = {key: value for key, value in where.items() if key not in INDEXED_FIELDS}
+        if rest:
+            matches = self._compile_filter(rest)
+            candidates = [id for id in candidates if matches(self._rows[id][2])]
+        return sorted(candidates, key=lambda id: self._rows[id][1])
     
     def get(self, where: Optional[Dict[str, Any]] = None, 
             include: Optional[List[str]] = None) -> Dict[str, Any]:
         """Get documents matching filter."""
-        result_ids = []
+        result_ids = list(self._rows) if not where else self._select(where)
         result_documents = []
         result_metadatas = []
         
-        for id, metadata in self.metadatas.items():
-            if where is None or self._matches_filter(metadata, where):
-                result_ids.append(id)
-                if include is None or "documents" in include:
-                    result_documents.append(self.documents.get(id, ""))
-                if include is None or "metadatas" in include:
-                    result_metadatas.append(metadata)
+        if include is None or "documents" in include:
+            result_documents = [self._rows[id][0] for id in result_ids]
+        if include is None or "metadatas" in include:
+            result_metadatas = [self._rows[id][2] for id in result_ids]
         
         return {
             "ids": result_ids,
@@ -106,66 +515,229 @@ class SimpleVectorStore:
     def query(self, query_embeddings: List[List[float]], n_results: int = 5,
               where: Optional[Dict[str, Any]] = None,
               include: Optional[List[str]] = None) -> Dict[str, Any]:
-        """Query for similar documents with optional filtering."""
-        if not self.embeddings:
-            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
-        
-        query_emb = np.array(query_embeddings[0])
-        
-        # Filter by where clause first
-        candidates = []
-        for id, metadata in self.metadatas.items():
-            if where is None or self._matches_filter(metadata, where):
-                candidates.append(id)
+        """
+        Query for similar documents with optional filtering.
         
-        if not candidates:
-            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        Results hold one list per query embedding; the where clause is
+        resolved once and shared by all of them.
+        """
+        n_queries = len(query_embeddings)
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if not self._rows or not n_queries:
+            for values in result.values():
+                values.extend([] for _ in range(max(n_queries, 1)))
+            return result
         
-        # Calculate distances
-        distances = []
-        for id in candidates:
-            emb = np.array(self.embeddings[id])
-            # Cosine distance
-            dist = 1 - np.dot(query_emb, emb) / (np.linalg.norm(query_emb) * np.linalg.norm(emb) + 1e-8)
-            distances.append((id, dist))
+        query_embs = self._normalize(query_embeddings)
         
-        # Sort by distance
-        distances.sort(key=lambda x: x[1])
-        
-        # Take top n_results
-        top_results = distances[:n_results]
-        
-        result_ids = [r[0] for r in top_results]
-        result_distances = [r[1] for r in top_results]
-        result_documents = [self.documents.get(id, "") for id in result_ids]
-        result_metadatas = [self.metadatas.get(id, {}) for id in result_ids]
+        with self._lock:
+            # Exclude deleted rows and rows rejected by the where clause
+            if where:
+                rows = np.array(
+                    [self._rows[id][1] for id in self._select(where)], dtype=np.intp
+                )
+            else:
+                rows = np.flatnonzero(self._live[:self._size])
+            
+            k = min(n_results, len(rows))
+            
+            # A selective filter only scores its candidate rows; otherwise
+            # scan the whole matrix and mask out the rest.
+            mask = None
+            if len(rows) * SELECTIVE_FILTER_RATIO >= self._size:
+                mask = np.zeros(self._size, dtype=bool)
+                mask[rows] = True
+            
+            if k <= 0:
+                for values in result.values():
+                    values.extend([] for _ in range(n_queries))
+                return result
+            
+            # Cosine similarity of every query in one GEMM, so each stored
+            # row is read once however many queries there are
+            if mask is None:
+                all_scores = self._score(rows, query_embs)
+            else:
+                all_scores = self._score(slice(0, self._size), query_embs)
+                all_scores[:, ~mask] = -np.inf
+            
+            for scores in all_scores:
+                # Partial selection of the top k, then sort only those
+                if k < len(scores):
+                    top = np.argpartition(-scores, k - 1)[:k]
+                else:
+                    top = np.arange(len(scores))
+                top = top[np.argsort(-scores[top])]
+                
+                top_rows = top if mask is not None else rows[top]
+                result_ids = [self._ids[row] for row in top_rows]
+                entries = [self._rows[id] for id in result_ids]
+                
+                result["ids"].append(result_ids)
+                result["documents"].append([text for text, _, _ in entries])
+                result["metadatas"].append([metadata for _, _, metadata in entries])
+                result["distances"].append((1 - scores[top]).tolist())
         
-        return {
-            "ids": [result_ids],
-            "documents": [result_documents],
-            "metadatas": [result_metadatas],
-            "distances": [result_distances]
-        }
+        return result
     
     def delete(self, where: Dict[str, Any]) -> int:
         """Delete documents matching filter."""
-        to_delete = []
-        for id, metadata in self.metadatas.items():
-            if self._matches_filter(metadata, where):
-                to_delete.append(id)
-        
-        for id in to_delete:
-            del self.documents[id]
-            del self.embeddings[id]
-            del self.metadatas[id]
+        with self._lock:
+            to_delete = self._select(where)
+            if not to_delete:
+                return 0
+            
+            # Tombstone the rows: zero the vectors and free the ids
+            rows = []
+            for id in to_delete:
+                _, row, metadata = self._rows.pop(id)
+                self._unindex(id, metadata)
+                self._ids[row] = None
+                rows.append(row)
+            self._matrix[rows] = 0
+            if self._quantized:
+                self._scales[rows] = 0
+            self._live[rows] = False
+            
+            self._db.executemany("DELETE FROM chunks WHERE id = ?", [(id,) for id in to_delete])
+        self._dirty.set()
         
-        self._save()
         return len(to_delete)
+    
+    def compact(self):
+        """
+        Rewrite the vector file without tombstoned rows.
+        
+        The compacted vectors are written to temporary files and fsynced,
+        the row remap is committed to sqlite together with a pending flag,
+        and only then are the temporary files swapped in. A crash at any
+        point leaves either the old layout or one `_load` can roll forward.
+        """
+        with self._lock:
+            if self._matrix is None:
+                return
+            
+            # Commit earlier writes on their own so a failed remap can roll back
+            self._save()
+            
+            live_rows = [row for row, id in enumerate(self._ids) if id is not None]
+            capacity = max(len(live_rows), 1024)
+            paths = [self._vec_path] + ([self._scale_path] if self._quantized else [])
+            arrays = [np.asarray(self._matrix[live_rows])]
+            if self._quantized:
+                arrays.append(np.asarray(self._scales[live_rows]))
+            try:
+                for path, array in zip(paths, arrays):
+                    with open(path + ".tmp", "wb") as f:
+                        f.write(array.tobytes())
+                        f.truncate(capacity * array.strides[0])
+                        f.flush()
+                        os.fsync(f.fileno())
+                
+                ids = [self._ids[row] for row in live_rows]
+                self._db.executemany(
+                    "UPDATE chunks SET row = ? WHERE id = ?",
+                    [(row, id) for row, id in enumerate(ids)]
+                )
+                self._set_meta("size", len(ids))
+                self._set_meta("compact_pending", 1)
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                for path in paths:
+                    if os.path.exists(path + ".tmp"):
+                        os.remove(path + ".tmp")
+                raise
+            
+            self._unmap()
+            self._finish_compact()
+            
+            self._ids = ids
+            for row, id in enumerate(ids):
+                text, _, metadata = self._rows[id]
+                self._rows[id] = (text, row, metadata)
+            self._live = np.zeros(0, dtype=bool)
+            self._map(capacity)
+            self._live[:len(ids)] = True
+            logger.info(f"Compacted vector store to {self._size} rows")
+    
+    def _finish_compact(self):
+        """Swap in committed compaction files and clear the pending flag."""
+        for path in (self._vec_path, self._scale_path):
+            if os.path.exists(path + ".tmp"):
+                os.replace(path + ".tmp", path)
+        fd = os.open(self.persist_path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self._db.execute("DELETE FROM meta WHERE name = 'compact_pending'")
+        self._db.commit()
+
+
+class QueryCache:
+    """
+    Bounded LRU cache of query results keyed by exact query text.
+    
+    Queries match after whitespace normalization only, with the same
+    filters and top_k. Similar-but-different queries always miss: templated
+    gap requirements that differ in one clause or standard number must not
+    share evidence. Entries must be cleared whenever the store changes.
+    """
+    
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # (normalized query, filter key) -> (results, expires_at)
+        self._entries: "OrderedDict[Tuple[str, tuple], Tuple[List[Dict[str, Any]], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(query: str, filter_key: tuple) -> Tuple[str, tuple]:
+        return " ".join(query.split()), filter_key
+    
+    def lookup(self, query: str, filter_key: tuple) -> Optional[List[Dict[str, Any]]]:
+        """Return cached results for the same query and filters, if any."""
+        key = self._key(query, filter_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return list(entry[0])
+    
+    def store(self, query: str, filter_key: tuple, results: List[Dict[str, Any]]):
+        """Cache results for a query, evicting the least recently used entry."""
+        if self.max_entries <= 0:
+            return
+        key = self._key(query, filter_key)
+        with self._lock:
+            self._entries[key] = (list(results), time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop all cached results."""
+        with self._lock:
+            self._entries.clear()
 
 
 # Global vector store
 _vector_store: Optional[SimpleVectorStore] = None
 
+# Global embedding cache
+_embedding_cache: Optional[EmbeddingCache] = None
+
+# Global query result cache
+_query_cache = QueryCache(
+    max_entries=settings.query_cache_size,
+    ttl=settings.query_cache_ttl
+)
+
 
 def _get_vector_store() -> SimpleVectorStore:
     """Get or create the vector store."""
@@ -177,21 +749,116 @@ def _get_vector_store() -> SimpleVectorStore:
     return _vector_store
 
 
+def close_vector_store():
+    """Flush pending vector store writes and stop its background saver."""
+    global _vector_store
+    if _vector_store is not None:
+        _vector_store.close()
+        _vector_store = None
+
+
+def _get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Get or create the embedding cache, if enabled."""
+    global _embedding_cache
+    if not settings.embedding_cache_enabled:
+        return None
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(settings.embedding_cache_dir)
+        logger.info(f"Initialized embedding cache at {settings.embedding_cache_dir}")
+    return _embedding_cache
+
+
+def _dedupe_texts(documents: List[str]) -> Tuple[List[str], List[int]]:
+    """
+    Collapse repeated texts (e.g. page headers and footers).
+    
+    Returns:
+        Tuple of (unique texts in first-seen order, index into them for each document)
+    """
+    position: Dict[str, int] = {}
+    inverse = [position.setdefault(text, len(position)) for text in documents]
+    if len(position) < len(documents):
+        logger.info(
+            f"Embedding {len(position)} unique texts for {len(documents)} chunks "
+            f"({len(documents) - len(position)} duplicates)"
+        )
+    return list(position), inverse
+
+
+def _embed_documents(documents: List[str]) -> List[Any]:
+    """Embed documents, reusing cached vectors for previously seen texts."""
+    unique, inverse = _dedupe_texts(documents)
+    
+    cache = _get_embedding_cache()
+    if cache is None:
+        embeddings = get_embeddings(unique)
+    else:
+        embeddings, misses = _lookup_cached_embeddings(cache, unique)
+        if misses:
+            miss_texts = [unique[i] for i in misses]
+            _fill_embeddings(cache, embeddings, misses, miss_texts, get_embeddings(miss_texts))
+    
+    return [embeddings[i] for i in inverse]
+
+
+async def _embed_documents_async(documents: List[str]) -> List[Any]:
+    """Async variant of _embed_documents that overlaps embedding requests."""
+    unique, inverse = _dedupe_texts(documents)
+    
+    cache = _get_embedding_cache()
+    if cache is None:
+        embeddings = await get_embeddings_async(unique)
+    else:
+        embeddings, misses = await asyncio.to_thread(_lookup_cached_embeddings, cache, unique)
+        if misses:
+            miss_texts = [unique[i] for i in misses]
+            miss_embeddings = await get_embeddings_async(miss_texts)
+            await asyncio.to_thread(
+                _fill_embeddings, cache, embeddings, misses, miss_texts, miss_embeddings
+            )
+    
+    return [embeddings[i] for i in inverse]
+
+
+def _lookup_cached_embeddings(
+    cache: EmbeddingCache,
+    documents: List[str]
+) -> Tuple[List[Any], List[int]]:
+    """Embeddings list with cache hits filled in, and the indices still missing."""
+    hits, misses = cache.get_many(documents, get_embedding_model_id())
+    
+    embeddings: List[Any] = [None] * len(documents)
+    for i, vector in hits.items():
+        embeddings[i] = vector
+    
+    logger.info(f"Embedding cache: {len(hits)} hits, {len(misses)} misses")
+    return embeddings, misses
+
+
+def _fill_embeddings(
+    cache: EmbeddingCache,
+    embeddings: List[Any],
+    misses: List[int],
+    miss_texts: List[str],
+    miss_embeddings: List[Any]
+):
+    """Fill in freshly computed embeddings and add them to the cache."""
+    for i, vector in zip(misses, miss_embeddings):
+        embeddings[i] = vector
+    cache.put_many(miss_texts, miss_embeddings, get_embedding_model_id())
+
+
 def get_collection():
     """Get the vector store (compatibility with ChromaDB API)."""
     return _get_vector_store()
 
 
-def index_chunks(chunks: List[Chunk], doc_id: str, filename: str,
-                 device_name: Optional[str] = None, 
-                 doc_type: str = "other") -> int:
-    """Index chunks into the vector store with extended metadata."""
-    if not chunks:
-        return 0
-    
-    store = _get_vector_store()
-    
-    # Prepare data
+def _prepare_chunks(
+    chunks: List[ChunkRecord],
+    device_name: Optional[str],
+    doc_type: str
+) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+    """Build the ids, texts and stored metadata for a list of chunks."""
     ids = []
     documents = []
     metadatas = []
@@ -221,17 +888,63 @@ def index_chunks(chunks: List[Chunk], doc_id: str, filename: str,
         }
         metadatas.append(metadata)
     
-    # Generate embeddings
-    logger.info(f"Generating embeddings for {len(documents)} chunks...")
-    embeddings = get_embeddings(documents)
-    
-    # Add to store
-    store.add(
+    return ids, documents, metadatas
+
+
+def _store_chunks(
+    ids: List[str],
+    documents: List[str],
+    embeddings: List[Any],
+    metadatas: List[Dict[str, Any]]
+):
+    """Add embedded chunks to the store and invalidate cached query results."""
+    _get_vector_store().add(
         ids=ids,
         documents=documents,
         embeddings=embeddings,
         metadatas=metadatas
     )
+    _query_cache.clear()
+
+
+def index_chunks(chunks: List[ChunkRecord], doc_id: str, filename: str,
+                 device_name: Optional[str] = None, 
+                 doc_type: str = "other") -> int:
+    """Index chunks into the vector store with extended metadata."""
+    if not chunks:
+        return 0
+    
+    ids, documents, metadatas = _prepare_chunks(chunks, device_name, doc_type)
+    
+    # Generate embeddings
+    logger.info(f"Generating embeddings for {len(documents)} chunks...")
+    embeddings = _embed_documents(documents)
+    
+    _store_chunks(ids, documents, embeddings, metadatas)
+    
+    logger.info(f"Indexed {len(chunks)} chunks for document '{filename}' (doc_id={doc_id})")
+    
+    return len(chunks)
+
+
+async def index_chunks_async(chunks: List[ChunkRecord], doc_id: str, filename: str,
+                             device_name: Optional[str] = None,
+                             doc_type: str = "other") -> int:
+    """
+    Index chunks without blocking the event loop.
+    
+    Embedding requests for the missing chunks run concurrently; cache and
+    store I/O run in worker threads.
+    """
+    if not chunks:
+        return 0
+    
+    ids, documents, metadatas = _prepare_chunks(chunks, device_name, doc_type)
+    
+    logger.info(f"Generating embeddings for {len(documents)} chunks...")
+    embeddings = await _embed_documents_async(documents)
+    
+    await asyncio.to_thread(_store_chunks, ids, documents, embeddings, metadatas)
     
     logger.info(f"Indexed {len(chunks)} chunks for document '{filename}' (doc_id={doc_id})")
     
@@ -243,8 +956,7 @@ def get_document_chunk_count(doc_id: str) -> int:
     store = _get_vector_store()
     
     try:
-        results = store.get(where={"doc_id": doc_id})
-        return len(results["ids"]) if results and results.get("ids") else 0
+        return store.document_chunk_count(doc_id)
     except Exception as e:
         logger.error(f"Error getting chunk count for {doc_id}: {e}")
         return 0
@@ -256,35 +968,8 @@ def list_documents() -> List[DocumentMetadata]:
     documents = []
     
     try:
-        results = store.get(include=["metadatas"])
-        
-        if not results or not results.get("metadatas"):
-            return documents
-        
-        # Group by doc_id
-        doc_info: Dict[str, Dict[str, Any]] = {}
-        
-        for metadata in results["metadatas"]:
-            doc_id = metadata.get("doc_id")
-            if doc_id:
-                if doc_id not in doc_info:
-                    doc_info[doc_id] = {
-                        "filename": metadata.get("filename", "unknown"),
-                        "uploaded_at": metadata.get("uploaded_at", ""),
-                        "device_name": metadata.get("device_name", ""),
-                        "doc_type": metadata.get("doc_type", "other"),
-                        "chunk_count": 0,
-                        "standards": set()
-                    }
-                doc_info[doc_id]["chunk_count"] += 1
-                
-                # Aggregate standards
-                standards = metadata.get("standards_referenced", [])
-                if isinstance(standards, list):
-                    doc_info[doc_id]["standards"].update(standards)
-        
         # Convert to DocumentMetadata objects
-        for doc_id, info in doc_info.items():
+        for doc_id, info in store.list_document_info().items():
             documents.append(DocumentMetadata(
                 doc_id=doc_id,
                 filename=info["filename"],
@@ -292,7 +977,7 @@ def list_documents() -> List[DocumentMetadata]:
                 doc_type=info["doc_type"],
                 chunks_indexed=info["chunk_count"],
                 uploaded_at=info["uploaded_at"],
-                standards_detected=sorted(list(info["standards"]))
+                standards_detected=info["standards"]
             ))
         
         # Sort by uploaded_at descending
@@ -309,13 +994,13 @@ def delete_document(doc_id: str) -> int:
     store = _get_vector_store()
     
     try:
-        chunk_count = get_document_chunk_count(doc_id)
+        # One doc_id index lookup both finds and deletes the chunks
+        chunk_count = store.delete(where={"doc_id": doc_id})
         
         if chunk_count == 0:
             return 0
         
-        # Delete chunks
-        store.delete(where={"doc_id": doc_id})
+        _query_cache.clear()
         
         logger.info(f"Deleted {chunk_count} chunks for document {doc_id}")
         
@@ -335,8 +1020,40 @@ def query_chunks(
     top_k: int = 5
 ) -> List[Dict[str, Any]]:
     """Query the vector store with optional metadata filtering."""
-    store = _get_vector_store()
+    return _query_texts([query], doc_id, device_name, doc_type, standard, top_k)[0]
+
+
+def query_chunks_batch(
+    queries: List[str],
+    doc_id: Optional[str] = None,
+    device_name: Optional[str] = None,
+    doc_type: Optional[str] = None,
+    standard: Optional[str] = None,
+    top_k: int = 5
+) -> List[List[Dict[str, Any]]]:
+    """
+    Run several queries with the same filters.
     
+    All queries are embedded in one model call and searched in one store
+    query, instead of one round trip each.
+    
+    Returns:
+        One result list per query, in the same order as queries
+    """
+    if not queries:
+        return []
+    return _query_texts(queries, doc_id, device_name, doc_type, standard, top_k)
+
+
+def _query_texts(
+    queries: List[str],
+    doc_id: Optional[str],
+    device_name: Optional[str],
+    doc_type: Optional[str],
+    standard: Optional[str],
+    top_k: int
+) -> List[List[Dict[str, Any]]]:
+    """Embed and search queries not already cached, one result list per query."""
     # Build filter
     where = {}
     if doc_id:
@@ -345,40 +1062,48 @@ def query_chunks(
         where["device_name"] = device_name
     if doc_type:
         where["doc_type"] = doc_type
-    # Note: standard filtering handled specially in _matches_filter
+    if standard:
+        # List field: matches chunks whose standards include this one
+        where["standards_referenced"] = standard
     
-    # Generate query embedding
-    query_embedding = get_embedding(query)
+    # Serve repeated queries from the query cache without embedding them
+    filter_key = (doc_id, device_name, doc_type, standard, top_k)
+    all_results: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+    if settings.query_cache_enabled:
+        for i, query in enumerate(queries):
+            all_results[i] = _query_cache.lookup(query, filter_key)
+        hits = sum(r is not None for r in all_results)
+        if hits:
+            logger.info(f"Query cache hit for {hits}/{len(queries)} queries")
+    
+    misses = [i for i, r in enumerate(all_results) if r is None]
+    if not misses:
+        return all_results
     
     # Execute query
-    results = store.query(
-        query_embeddings=[query_embedding],
+    results = _get_vector_store().query(
+        query_embeddings=list(get_query_embeddings([queries[i] for i in misses])),
         n_results=top_k,
         where=where if where else None,
         include=["documents", "metadatas", "distances"]
     )
     
-    # Filter by standard if specified (post-query filter for list field)
-    formatted_results = []
-    
-    if results and results.get("ids") and results["ids"][0]:
-        for i, chunk_id in enumerate(results["ids"][0]):
-            metadata = results["metadatas"][0][i] if results.get("metadatas") else {}
-            
-            # Filter by standard if specified
-            if standard:
-                chunk_standards = metadata.get("standards_referenced", [])
-                if standard not in chunk_standards:
-                    continue
-            
-            formatted_results.append({
+    for q, i in enumerate(misses):
+        formatted_results = [
+            {
                 "chunk_id": chunk_id,
-                "text": results["documents"][0][i] if results.get("documents") else "",
-                "metadata": metadata,
-                "distance": results["distances"][0][i] if results.get("distances") else 0
-            })
+                "text": results["documents"][q][j],
+                "metadata": results["metadatas"][q][j],
+                "distance": results["distances"][q][j]
+            }
+            for j, chunk_id in enumerate(results["ids"][q])
+        ]
+        
+        if settings.query_cache_enabled:
+            _query_cache.store(queries[i], filter_key, formatted_results)
+        all_results[i] = formatted_results
     
-    return formatted_results
+    return all_results
 
 
 def document_exists(doc_id: str) -> bool: